@@ -0,0 +1,35 @@
+from config.logger import setup_logger
+from services.checkpoints import failures
+from services.file_services import FileService
+from services.queue_service import RERUN_TOKENS, rerun_failed_codes_task
+
+logger = setup_logger("failures_controller")
+
+file_service = FileService()
+
+STAGES = ("ta", "energy")
+
+
+async def get_failures(trade_day: str):
+    """Failure ledger of the HK TA and HK Energy runs of `trade_day`"""
+    return {stage: failures(stage, trade_day) for stage in STAGES}
+
+
+async def rerun_failed(stage: str, trade_day: str):
+    """Re-queue only the failed codes of `stage` for `trade_day`; outputs are appended to the result tables"""
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    token = await file_service.read_data_from_csv(RERUN_TOKENS[stage])
+    existing_task_id = token[0].get("task_id") if token else None
+    if existing_task_id:
+        return {"task_id": existing_task_id, "status": "ERROR", "message": f"HK {stage.upper()} run in progress", "codes": []}
+
+    codes = [entry["stock_code"] for entry in failures(stage, trade_day)]
+    if not codes:
+        return {"task_id": "", "status": "SKIPPED", "message": f"No failed {stage} codes for {trade_day}", "codes": []}
+
+    task = rerun_failed_codes_task.delay(stage, trade_day, codes)
+    file_service.add_data_to_csv(RERUN_TOKENS[stage], [{"task_id": task.id}], ["task_id"])
+    logger.info(f"Re-running {len(codes)} failed {stage} codes for {trade_day}, task_id: {task.id}")
+    return {"task_id": task.id, "status": "QUEUED", "message": f"{len(codes)} failed {stage} codes re-queued", "codes": codes}
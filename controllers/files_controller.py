@@ -1,72 +1,81 @@
-import os
 import zipfile
-import io
+from collections import deque
+from typing import Iterator, List, Optional
 from fastapi.responses import StreamingResponse
 from fastapi import HTTPException
 
-from services.file_services import FileService
+from services.result_store import result_store
 from config.settings import settings
 from config.logger import setup_logger
 
 logger = setup_logger("files_controller")
 
+# Short names accepted by /api/files?table=
+TABLE_ALIASES = {
+    "ta1": settings.test_db_table_ta1,
+    "ta2": settings.test_db_table_ta2,
+    "energy": settings.test_db_table_energy,
+}
 
-async def download_csv_files():
+
+class _ZipSink:
+    """Write-only file object for ZipFile; compressed bytes are collected until drained"""
+
+    def __init__(self):
+        self._chunks = deque()
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        while self._chunks:
+            yield self._chunks.popleft()
+
+
+def _zip_stream(filenames: List[str], trade_day: Optional[str]) -> Iterator[bytes]:
+    """ZIP archive of the result tables, produced entry by entry as rows are read and compressed"""
+    sink = _ZipSink()
+    # An unseekable sink makes ZipFile write data descriptors instead of seeking back
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for filename in filenames:
+            with zip_file.open(f"{filename}.csv", 'w', force_zip64=True) as entry:
+                for chunk in result_store.iter_csv(filename, trade_day):
+                    entry.write(chunk)
+                    yield from sink.drain()
+            logger.info(f"Successfully added file to ZIP: {filename}.csv")
+            yield from sink.drain()
+    # Central directory
+    yield from sink.drain()
+
+
+async def download_csv_files(trade_day: Optional[str] = None, tables: Optional[List[str]] = None):
     """
-    Download CSV files as ZIP archive from the data directory
+    Download the result tables as CSV files in a ZIP archive, streamed while it is compressed.
+    `trade_day` keeps only that day's rows; `tables` (ta1 / ta2 / energy or full names) selects tables.
     """
-    try:
-        file_service = FileService()
-        filenames = [
-            settings.test_db_table_ta1,
-            settings.test_db_table_ta2, 
-            settings.test_db_table_energy
-        ]
-        
-        # Create ZIP file in memory
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            files_added = 0
-            
-            for filename in filenames:
-                try:
-                    file_path = f"{file_service.data_dir}/{filename}.csv"
-                    if os.path.exists(file_path):
-                        # Read file content
-                        with open(file_path, 'r', encoding='utf-8') as file:
-                            content = file.read()
-                        
-                        # Add to ZIP
-                        zip_file.writestr(f"{filename}.csv", content)
-                        files_added += 1
-                        logger.info(f"Successfully added file to ZIP: {filename}.csv")
-                    else:
-                        logger.warning(f"File not found: {filename}.csv")
-                except Exception as e:
-                    logger.error(f"Error reading file {filename}.csv: {e}")
-        
-        if files_added == 0:
+    filenames = [
+        settings.test_db_table_ta1,
+        settings.test_db_table_ta2,
+        settings.test_db_table_energy
+    ]
+    if tables:
+        selected = [TABLE_ALIASES.get(table.strip(), table.strip()) for table in tables]
+        unknown = [table for table in selected if table not in filenames]
+        if unknown:
             raise HTTPException(
-                status_code=404,
-                detail="No CSV files found"
+                status_code=400,
+                detail=f"Unknown tables: {', '.join(unknown)}"
             )
-        
-        # Reset buffer position
-        zip_buffer.seek(0)
-        
-        # Return ZIP file as streaming response
-        return StreamingResponse(
-            io.BytesIO(zip_buffer.read()),
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=csv_files.zip"}
-        )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error creating ZIP file: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error creating ZIP file: {str(e)}"
-        )
+        filenames = [filename for filename in filenames if filename in selected]
+
+    archive_name = f"csv_files_{trade_day}.zip" if trade_day else "csv_files.zip"
+    return StreamingResponse(
+        _zip_stream(filenames, trade_day),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={archive_name}"}
+    )
@@ -2,9 +2,12 @@
 from config.logger import setup_logger
 from config.settings import Settings
 from models.schemas import EnergyStockRecord
-from services.db_service import Database_Service
-from services.hk_energy import HK_Energy_TA
+from services.db_service import Async_Database_Service
+from services.hk_energy import HK_Energy_TA, energy_price_window
 from services.file_services import FileService
+from services.price_loader import PriceWindow, load_symbols_adjusted_data
+from services.price_store import price_store
+from typing import Optional
 from asyncio import sleep
 
 energy_logger = setup_logger("hk_energy_controller")
@@ -22,14 +25,18 @@ db_params_seghio = {
     "port": settings.serhio_db_port,
 }
 
-db_service = Database_Service(db_params_seghio, pool_size=10)
+db_service = Async_Database_Service(db_params_seghio, pool_size=10)
 
-async def call_get_symbol_adjusted_data(stock_name: str, max_retries = 3):
+async def call_get_symbol_adjusted_data(stock_name: str, max_retries = 3, window: Optional[PriceWindow] = None):
 
     query = f"""
             CALL get_symbol_adjusted_data('{stock_name}');
             """
 
+    stored = price_store.lookup(stock_name, window)
+    if stored:
+        return stored
+
     rows = None 
     for attempt in range(max_retries):
         try:
@@ -38,7 +45,7 @@ async def call_get_symbol_adjusted_data(stock_name: str, max_retries = 3):
                     
             if rows:
                 logger.info(f"Query successful for {stock_name}: {len(rows)} rows returned")
-                return rows
+                return window.apply(rows) if window is not None else rows
             else:
                 logger.warning(f"Query returned empty result for {stock_name} (attempt {attempt + 1})")
                         
@@ -51,7 +58,9 @@ async def call_get_symbol_adjusted_data(stock_name: str, max_retries = 3):
                 if attempt < max_retries - 1:
                     await sleep(1)
 
-def prepare_stock_data(stock_data, trade_day: str, stock_code: str):
+def prepare_stock_data(stock_data, trade_day: str, stock_code: str, window: Optional[PriceWindow] = None):
+    if window is not None:
+        stock_data = window.apply(stock_data)
     stock_data_new = []
     if not any(row[2].strftime('%Y-%m-%d') == trade_day for row in stock_data):
         return []
@@ -80,8 +89,11 @@ def prepare_stock_data(stock_data, trade_day: str, stock_code: str):
 async def hk_energy_controller(stock_code: str, trade_day: str):
     logger.info(f"Starting hk_energy_controller for {stock_code} on {trade_day}")
     try:
-
-        stock_data_serhio = await call_get_symbol_adjusted_data(stock_code)
+        # Stock and 2800 histories are fetched in one round trip
+        window = energy_price_window(trade_day)
+        histories = await load_symbols_adjusted_data([stock_code, '2800'], window)
+        stock_data_serhio = histories.get(stock_code.strip())
+        results_2800_serhio = histories.get('2800')
         if stock_data_serhio:
             logger.info(f"Fetched {len(stock_data_serhio)} records from Serhio database")
 
@@ -98,7 +110,6 @@ async def hk_energy_controller(stock_code: str, trade_day: str):
             raise
 
     try:
-        results_2800_serhio = await call_get_symbol_adjusted_data('2800')
         if results_2800_serhio:
             stock_data_2800_serhio_new = prepare_stock_data(results_2800_serhio, trade_day, '2800')
         else:
@@ -1,6 +1,7 @@
+import time
 from config.logger import setup_logger
 from services.file_services import FileService
-from services.queue_service import prepare_hk_ta
+from services.queue_service import cancel_task, celery_app, prepare_hk_ta
 from config.settings import settings
 
 route_logger = setup_logger("iniitalise")
@@ -8,16 +9,46 @@ logger = route_logger
 
 file_service = FileService()
 
-async def hk_ta_initialise():
+# The token keeps the run's arguments, so a woken-up run continues with them
+TOKEN_FIELDS = ["task_id", "force", "started_at"]
+
+async def hk_ta_initialise(force: bool = False):
+    """Start the HK TA check; `force` recomputes every code even if the trade day already completed"""
     hk_ta_token = await file_service.read_data_from_csv(settings.hk_ta_token_file_name)
     logger.info(f"HK TA token: {hk_ta_token}")
     existing_task_id = hk_ta_token[0].get("task_id") if hk_ta_token else None
     if existing_task_id:
         return {"task_id": existing_task_id, "status": "ERROR", "message": "HK TA already started"}
     else:
-        await file_service.clear_file_content('signals_hkex_ta1')
-        await file_service.clear_file_content('signals_hkex_ta2')
-        task = prepare_hk_ta.delay()
+        # signals_hkex_ta1/ta2 are cleared by prepare_hk_ta unless the trade day's run is resumed
+        started_at = time.time()
+        task = prepare_hk_ta.delay(started_at=started_at, force=force)
         logger.info(f"HK TA check started, task_id: {task.id}")
-        file_service.add_data_to_csv(settings.hk_ta_token_file_name, [{"task_id": task.id}], ["task_id"])
-        return {"task_id": task.id, "status": "QUEUED", "message": "HK TA check started"}
\ No newline at end of file
+        file_service.add_data_to_csv(settings.hk_ta_token_file_name,
+                                     [{"task_id": task.id, "force": force, "started_at": started_at}], TOKEN_FIELDS)
+        return {"task_id": task.id, "status": "QUEUED", "message": "HK TA check started"}
+
+async def hk_ta_prices_ready():
+    """
+    Prices are adjusted: start HK TA now instead of waiting for the next scheduled check.
+    A prepare_hk_ta waiting for its retry countdown is revoked and re-queued to run immediately
+    with the same `force` and poll start; a run that is already processing is left alone.
+    """
+    hk_ta_token = await file_service.read_data_from_csv(settings.hk_ta_token_file_name)
+    existing_task_id = hk_ta_token[0].get("task_id") if hk_ta_token else None
+    if not existing_task_id:
+        return await hk_ta_initialise()
+
+    state = celery_app.AsyncResult(existing_task_id).state
+    if state != "RETRY":
+        return {"task_id": existing_task_id, "status": "ERROR", "message": f"HK TA already running ({state})"}
+
+    force = hk_ta_token[0].get("force") == "True"
+    started_at = float(hk_ta_token[0].get("started_at") or time.time())
+    cancel_task(existing_task_id)
+    task = prepare_hk_ta.delay(started_at=started_at, force=force)
+    logger.info(f"HK TA check woken up, task_id: {task.id} (replaces {existing_task_id}, force={force})")
+    await file_service.clear_file_content(settings.hk_ta_token_file_name)
+    file_service.add_data_to_csv(settings.hk_ta_token_file_name,
+                                 [{"task_id": task.id, "force": force, "started_at": started_at}], TOKEN_FIELDS)
+    return {"task_id": task.id, "status": "QUEUED", "message": "HK TA check started by prices ready trigger"}
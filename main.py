@@ -5,6 +5,10 @@ import uvicorn
 from config.settings import settings
 from config.logger import setup_logger
 from routes.api_routes import router
+from services.hk_ta import db_service as ta_db_service
+from controllers.hk_energy.hk_energy import db_service as energy_db_service
+from services.price_loader import db_service as price_db_service
+from services.result_store import result_store
 
 app_logger = setup_logger("fastapi_app")
 logger = app_logger
@@ -28,11 +32,14 @@ app.include_router(router, prefix='/api')
 
 @app.on_event("startup")
 async def startup_event():
-    pass
+    # One-time import of the legacy result CSVs, so reads never have to
+    result_store.migrate()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    pass
+    await ta_db_service.close()
+    await energy_db_service.close()
+    await price_db_service.close()
 
 if __name__ == "__main__":
     uvicorn.run(
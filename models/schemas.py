@@ -8,6 +8,7 @@ class CodeesResponse(BaseModel):
 class AlgoRequest(BaseModel):
     stock_code: str
     trade_day: str
+    full_history: bool = False  # verify against the full-history TA path
 
 
 class AlgoResponse(BaseModel):
@@ -78,11 +79,35 @@ class HKTaCheckResponse(BaseModel):
 # HK Energy
 class HKEnergyRequest(BaseModel):
     trade_day: str
+    force: bool = False  # recompute every code even if the trade day's run already completed
 class HKEnergyResponse(BaseModel):
     task_id: str
     status: str
     message: Optional[str] = None
 
+# Failed codes
+class FailedCode(BaseModel):
+    stock_code: str
+    stage: str
+    error: Optional[str] = None
+    duration: Optional[float] = None
+    failed_at: Optional[str] = None
+
+class FailuresResponse(BaseModel):
+    trade_day: str
+    ta: List[FailedCode] = []
+    energy: List[FailedCode] = []
+
+class RerunFailedRequest(BaseModel):
+    trade_day: str
+    stage: str  # "ta" or "energy"
+
+class RerunFailedResponse(BaseModel):
+    task_id: str
+    status: str
+    message: Optional[str] = None
+    codes: List[str] = []
+
 # HK Signal
 class HKSignalRequest(BaseModel):
     code: str
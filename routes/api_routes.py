@@ -1,19 +1,21 @@
 from celery import chord
 from controllers.hk_energy.hk_energy_init_task import hk_energy_initialise
-from fastapi import APIRouter, HTTPException
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Optional
 
 from controllers.get_stocks_codes import get_stocks_codes
 from controllers.hk_energy.hk_energy import hk_energy_controller
 from controllers.hk_ta.cancel_task import hk_ta_cancel_task
-from controllers.hk_ta.hk_ta_init_task import hk_ta_initialise
+from controllers.hk_ta.hk_ta_init_task import hk_ta_initialise, hk_ta_prices_ready
 from controllers.files_controller import download_csv_files
+from controllers.failures_controller import get_failures, rerun_failed
 
 
 from models.schemas import (
     AlgoRequest, AlgoResponse,  EnergyAlgoResponse, 
     EnergyAlgoRequestTest,  CodeesResponse, HKEnergyResponse, HKTaCancelResponse, HKEnergyRequest,
-    HKTaCheckResponse, HKSignalRequest, HKSignalResponse
+    HKTaCheckResponse, HKSignalRequest, HKSignalResponse,
+    FailuresResponse, RerunFailedRequest, RerunFailedResponse
 )
 
 from services.hk_ta import HK_TA
@@ -45,7 +47,7 @@ async def process_stock(request: AlgoRequest):
             )
         logger.info(f"Stockname: {request.stock_code}, TradeDay: {request.trade_day}")
 
-        result = await HK_TA.start(request.stock_code.strip(), request.trade_day.strip())
+        result = await HK_TA.start(request.stock_code.strip(), request.trade_day.strip(), full_history=request.full_history)
         
         if result["status"] == "error":
             logger.error(f"Error: {result['message']}")
@@ -130,7 +132,7 @@ async def hk_energy(request: HKEnergyRequest):
                 detail="Missing or invalid required fields!"
             )
 
-        result = await hk_energy_initialise(request.trade_day.strip())
+        result = await hk_energy_initialise(request.trade_day.strip(), request.force)
         
         return HKEnergyResponse(
             task_id=result["task_id"],
@@ -147,15 +149,16 @@ async def hk_energy(request: HKEnergyRequest):
 
 # HK TA
 @router.get("/hk-ta", response_model=HKTaCheckResponse)
-async def check_hk_ta():
+async def check_hk_ta(force: bool = False):
     """
     Start HK TA database check with retry mechanism
-    Checks database every 1 minute until data is found or max attempts reached
+    Checks the database on the configured poll schedule until data is found or the deadline passes.
+    ?force=true drops the trade day's checkpoints, so a completed day is computed again
     """
     try:
         logger.info(f"Starting HK TA !!!")
         
-        result = await hk_ta_initialise()
+        result = await hk_ta_initialise(force)
         
         return HKTaCheckResponse(
             task_id=result["task_id"],
@@ -171,6 +174,27 @@ async def check_hk_ta():
         )
 
 
+@router.post("/hk-ta/prices-ready", response_model=HKTaCheckResponse)
+async def hk_ta_prices_ready_endpoint():
+    """
+    Notification from the price loader that adjusted prices are ready.
+    Starts HK TA immediately (or wakes the waiting check) instead of waiting for the next poll
+    """
+    try:
+        result = await hk_ta_prices_ready()
+        return HKTaCheckResponse(
+            task_id=result["task_id"],
+            status=result["status"],
+            message=result["message"]
+        )
+    except Exception as e:
+        logger.error(f"Error handling prices ready trigger: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error handling prices ready trigger: {str(e)}"
+        )
+
+
 @router.delete("/hk-ta/queue/cancel/{task_id}", response_model=HKTaCancelResponse)
 async def cancel_task_endpoint(task_id: str):
     """Cancel a queued task"""
@@ -185,6 +209,43 @@ async def cancel_task_endpoint(task_id: str):
         )
 
 
+# Failed codes
+@router.get("/failures/{trade_day}", response_model=FailuresResponse)
+async def failures_endpoint(trade_day: str):
+    """Codes that failed in the HK TA / HK Energy runs of a trade day, with error and duration"""
+    try:
+        result = await get_failures(trade_day.strip())
+        return FailuresResponse(trade_day=trade_day.strip(), **result)
+    except Exception as e:
+        logger.error(f"Error reading failures: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading failures: {str(e)}"
+        )
+
+
+@router.post("/rerun-failed", response_model=RerunFailedResponse)
+async def rerun_failed_endpoint(request: RerunFailedRequest):
+    """
+    Re-queue only the failed codes of a HK TA / HK Energy run for the same trade day.
+    Their outputs are appended to the existing result files
+    """
+    if request.stage not in ("ta", "energy") or not request.trade_day.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="stage must be 'ta' or 'energy' and trade_day is required"
+        )
+    try:
+        result = await rerun_failed(request.stage, request.trade_day.strip())
+        return RerunFailedResponse(**result)
+    except Exception as e:
+        logger.error(f"Error re-running failed codes: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error re-running failed codes: {str(e)}"
+        )
+
+
 @router.post("/hk-signal", response_model=HKSignalResponse)
 async def hk_signal(request: HKSignalRequest):
     """
@@ -222,8 +283,9 @@ async def hk_signal(request: HKSignalRequest):
 
 
 @router.get("/files")
-async def get_files():
+async def get_files(trade_day: Optional[str] = None, table: Optional[List[str]] = Query(None)):
     """
-    Download CSV files as ZIP archive from the data directory
+    Download the result tables as a streamed ZIP archive.
+    Optional filters: ?trade_day=YYYY-MM-DD and one or more ?table=ta1|ta2|energy
     """
-    return await download_csv_files()
\ No newline at end of file
+    return await download_csv_files(trade_day.strip() if trade_day else None, table)
\ No newline at end of file
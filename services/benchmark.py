@@ -0,0 +1,198 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Union
+
+import redis
+
+from config.logger import setup_logger
+from config.settings import settings
+
+benchmark_logger = setup_logger("benchmark")
+logger = benchmark_logger
+
+# Benchmark symbol (Tracker Fund of Hong Kong)
+BENCHMARK_CODE = "2800"
+
+# Look-back periods used by E4 (33) and PR (5/20/60/125/250)
+RETURN_PERIODS = (5, 20, 33, 60, 125, 250)
+
+# How many aligned benchmarks a process keeps (one per trade day / data source)
+CACHE_SIZE = 8
+
+# Published payloads outlive a run (and its retries) but do not pile up
+PAYLOAD_TTL = 2 * 24 * 3600
+
+
+def date_key(value: Any) -> str:
+    """Normalise date / datetime / Timestamp / ISO string to 'YYYY-MM-DD'."""
+    return str(value)[:10]
+
+
+class AlignedBenchmark:
+    """
+    Benchmark closes with a date -> position hash index and precomputed
+    n-bar return ratios (close[p] / close[p - n]), so stocks align in O(1) per bar.
+    """
+
+    def __init__(self, dates: Sequence[Any], closes: Sequence[float], periods: Sequence[int] = RETURN_PERIODS):
+        self.dates = [date_key(d) for d in dates]
+        self.closes = [float(c) for c in closes]
+
+        # First occurrence wins, same as list.index()
+        self._positions: Dict[str, int] = {}
+        for i, d in enumerate(self.dates):
+            self._positions.setdefault(d, i)
+
+        self._returns: Dict[int, List[float]] = {}
+        for n in periods:
+            self._returns[n] = self._build_returns(n)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Any], periods: Sequence[int] = RETURN_PERIODS) -> "AlignedBenchmark":
+        """Build from dicts ({'date', 'close'}) or objects with .date / .close."""
+        dates = []
+        closes = []
+        for record in records:
+            if isinstance(record, dict):
+                dates.append(record["date"])
+                closes.append(record["close"])
+            else:
+                dates.append(record.date)
+                closes.append(record.close)
+        return cls(dates, closes, periods)
+
+    def _build_returns(self, n: int) -> List[float]:
+        closes = self.closes
+        returns = [float('nan')] * min(n, len(closes))
+        for p in range(n, len(closes)):
+            base = closes[p - n]
+            returns.append(closes[p] / base if base != 0 else float('nan'))
+        return returns
+
+    def __len__(self) -> int:
+        return len(self.closes)
+
+    def position(self, date: Any) -> Optional[int]:
+        """Position of `date` in the benchmark series, None if the benchmark did not trade."""
+        return self._positions.get(date_key(date))
+
+    def ratio(self, position: int, n: int) -> float:
+        """close[position] / close[position - n]; NaN when there is not enough history."""
+        returns = self._returns.get(n)
+        if returns is None:
+            if position < n:
+                return float('nan')
+            base = self.closes[position - n]
+            return self.closes[position] / base if base != 0 else float('nan')
+        return returns[position]
+
+    def ratio_between(self, position: int, base_position: int) -> float:
+        """close[position] / close[base_position], served from the precomputed arrays when contiguous."""
+        n = position - base_position
+        if n in self._returns:
+            return self._returns[n][position]
+        base = self.closes[base_position]
+        return self.closes[position] / base if base != 0 else float('nan')
+
+
+_cache: "OrderedDict[Hashable, AlignedBenchmark]" = OrderedDict()
+
+
+def get_aligned_benchmark(key: Hashable, build: Callable[[], AlignedBenchmark]) -> AlignedBenchmark:
+    """
+    Per-process memo: the benchmark is aligned once per key (trade day + data
+    fingerprint) and shared by every stock processed afterwards.
+    """
+    benchmark = _cache.get(key)
+    if benchmark is not None:
+        _cache.move_to_end(key)
+        return benchmark
+
+    benchmark = build()
+    _cache[key] = benchmark
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    logger.info(f"Aligned benchmark built for {key}: {len(benchmark)} bars")
+    return benchmark
+
+
+_fingerprints: "OrderedDict[int, tuple]" = OrderedDict()
+
+
+def records_fingerprint(records: Sequence[Any]) -> tuple:
+    """
+    Identity of a benchmark payload: length plus a sha1 over every date and close, so an
+    adjustment anywhere in the history gives a new key. Payloads are shared and not changed
+    in place, so the hash is kept per object (the entry holds the object, its id stays valid).
+    """
+    if not records:
+        return (0,)
+
+    entry = _fingerprints.get(id(records))
+    if entry is not None and entry[0] is records:
+        _fingerprints.move_to_end(id(records))
+        return entry[1]
+
+    digest = hashlib.sha1()
+    for record in records:
+        if isinstance(record, dict):
+            date, close = record["date"], record["close"]
+        else:
+            date, close = record.date, record.close
+        digest.update(f"{date_key(date)}|{close!r}\n".encode("utf-8"))
+    fingerprint = (len(records), digest.hexdigest()[:16])
+
+    _fingerprints[id(records)] = (records, fingerprint)
+    if len(_fingerprints) > CACHE_SIZE:
+        _fingerprints.popitem(last=False)
+    return fingerprint
+
+
+_redis_client: Optional[redis.Redis] = None
+_payloads: "OrderedDict[str, Any]" = OrderedDict()
+
+
+def _redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.celery_result_backend)
+    return _redis_client
+
+
+def publish_payload(kind: str, trade_day: str, payload: List[Dict]) -> str:
+    """
+    Store a benchmark payload once per run and return its key, so task messages
+    carry the key instead of the series. The key is versioned by content.
+    """
+    data = json.dumps(payload, default=str, sort_keys=True)
+    version = hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+    key = f"benchmark:{BENCHMARK_CODE}:{kind}:{trade_day}:{version}"
+    _redis().set(key, data, ex=PAYLOAD_TTL)
+    logger.info(f"Benchmark payload published as {key}: {len(payload)} records, {len(data)} bytes")
+    return key
+
+
+def load_payload(ref: Union[str, List[Dict]], parse: Optional[Callable[[List[Dict]], Any]] = None) -> Any:
+    """
+    Payload behind a key from publish_payload, read once per process and kept parsed.
+    A list is taken as the payload itself (messages queued before payloads were published).
+    """
+    if not isinstance(ref, str):
+        return parse(ref) if parse else ref
+
+    payload = _payloads.get(ref)
+    if payload is not None:
+        _payloads.move_to_end(ref)
+        return payload
+
+    data = _redis().get(ref)
+    if data is None:
+        raise LookupError(f"Benchmark payload {ref} is not available (expired or never published)")
+    payload = json.loads(data)
+    if parse:
+        payload = parse(payload)
+    _payloads[ref] = payload
+    if len(_payloads) > CACHE_SIZE:
+        _payloads.popitem(last=False)
+    return payload
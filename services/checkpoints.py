@@ -0,0 +1,88 @@
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import redis
+
+from config.logger import setup_logger
+from config.settings import settings
+
+checkpoint_logger = setup_logger("checkpoints")
+logger = checkpoint_logger
+
+# A trade day's run can be resumed for this long
+CHECKPOINT_TTL = 3 * 24 * 3600
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.celery_result_backend)
+    return _redis_client
+
+
+def _key(stage: str, trade_day: str) -> str:
+    return f"checkpoint:{stage}:{trade_day}"
+
+
+def _failures_key(stage: str, trade_day: str) -> str:
+    return f"failures:{stage}:{trade_day}"
+
+
+def completed_codes(stage: str, trade_day: str) -> Set[str]:
+    """Codes whose `stage` ("ta" / "energy") output for `trade_day` is already written"""
+    return {code.decode("utf-8") for code in _redis().smembers(_key(stage, trade_day))}
+
+
+def mark_completed(stage: str, trade_day: str, codes: Iterable[str]) -> None:
+    """Record codes whose output rows were written; called after the CSV append"""
+    codes = [code.strip() for code in codes]
+    if not codes:
+        return
+    try:
+        pipe = _redis().pipeline()
+        pipe.sadd(_key(stage, trade_day), *codes)
+        pipe.expire(_key(stage, trade_day), CHECKPOINT_TTL)
+        pipe.hdel(_failures_key(stage, trade_day), *codes)
+        pipe.execute()
+    except Exception as e:
+        # The rows are written; a lost checkpoint only means the code is computed again on resume
+        logger.error(f"Checkpoint update failed for {stage} {trade_day}: {e}")
+
+
+def record_failure(stage: str, trade_day: str, code: str, error: Any, duration: float) -> None:
+    """Add a failed code to the run's failure ledger (the latest attempt wins)"""
+    entry = {
+        "stock_code": code.strip(),
+        "stage": stage,
+        "error": str(error),
+        "duration": round(duration, 3),
+        "failed_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+    }
+    try:
+        pipe = _redis().pipeline()
+        pipe.hset(_failures_key(stage, trade_day), code.strip(), json.dumps(entry))
+        pipe.expire(_failures_key(stage, trade_day), CHECKPOINT_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failure ledger update failed for {stage} {trade_day} {code}: {e}")
+
+
+def failures(stage: str, trade_day: str) -> List[Dict[str, Any]]:
+    """Failure ledger of a run: one entry per code that has not succeeded since it failed"""
+    entries = [json.loads(value) for value in _redis().hgetall(_failures_key(stage, trade_day)).values()]
+    return sorted(entries, key=lambda entry: entry["stock_code"])
+
+
+def reset(stage: str, trade_day: str) -> None:
+    """Forget a run's checkpoints and failures, so the next run of the trade day starts fresh"""
+    _redis().delete(_key(stage, trade_day), _failures_key(stage, trade_day))
+
+
+def pending_codes(stage: str, trade_day: str, codes: Sequence[str]) -> List[str]:
+    """`codes` without the ones already completed, in order"""
+    done = completed_codes(stage, trade_day)
+    return [code for code in codes if code.strip() not in done]
+
@@ -1,8 +1,14 @@
+import aiomysql
 import pymysql
 import threading
+from pymysql.constants import CLIENT
 import asyncio
+import os
+import time
+from collections import deque
 from typing import List, Tuple, Dict, Any, Optional
 from config.logger import setup_logger
+from config.settings import settings
 from contextlib import contextmanager
 
 
@@ -10,109 +16,356 @@ db_logger = setup_logger("db_service")
 logger = db_logger
 
 
+class PoolTimeoutError(Exception):
+    """No connection became available within the checkout timeout"""
+
+
 class Database_Service:
-    def __init__(self, db_params: Dict[str, Any], pool_size: int = 10):
-        self.db_params = db_params
+    def __init__(self, db_params: Dict[str, Any], pool_size: int = 10,
+                 min_size: int = settings.db_pool_min_size,
+                 checkout_timeout: float = settings.db_pool_checkout_timeout,
+                 idle_timeout: float = settings.db_pool_idle_timeout,
+                 health_check_after: float = settings.db_pool_health_check_after):
+        # Pooled connections must not keep a REPEATABLE READ snapshot between queries
+        self.db_params = {"autocommit": True, **db_params}
         self.pool_size = pool_size
-        self._local = threading.local()
-        self._lock = threading.Lock()
-        self._connection_count = 0
+        self.min_size = min(min_size, pool_size)
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
 
-    def _get_connection(self):
-        """Get thread-local connection"""
-        if not hasattr(self._local, 'connection') or self._local.connection is None:
-            try:
-                with self._lock:
-                    if self._connection_count >= self.pool_size:
-                        logger.warning(f"Connection pool limit reached ({self.pool_size})")
-                    
-                    self._local.connection = pymysql.connect(**self.db_params)
-                    self._connection_count += 1
-                    logger.info(f"New database connection created (total: {self._connection_count})")
-            except Exception as e:
-                logger.error(f"Database connection failed: {e}")
-                raise
-        return self._local.connection
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()  # (connection, last_used), most recently used on the right
+        self._size = 0  # open connections: idle + checked out
+        self._generation = 0
+        self._pid = os.getpid()
+        self._stats = self._empty_stats()
 
-    def _close_connection(self) -> None:
-        """Close thread-local connection"""
-        if hasattr(self._local, 'connection') and self._local.connection:
-            try:
-                self._local.connection.close()
-                with self._lock:
-                    self._connection_count -= 1
-                logger.info(f"Database connection closed (remaining: {self._connection_count})")
-            except Exception as e:
-                logger.error(f"Error closing connection: {e}")
-            finally:
-                self._local.connection = None
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "evicted": 0,
+        }
+
+    def _check_fork(self) -> None:
+        """Drop connections inherited from a parent process (Celery prefork) without closing their sockets"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._size = 0
+            self._generation += 1
+            self._stats = self._empty_stats()
 
-    def _ensure_connection(self) -> None:
-        """Ensure thread-local connection is active"""
+    def _connect(self):
+        connection = pymysql.connect(**self.db_params)
+        with self._cond:
+            self._stats["created"] += 1
+        logger.info(f"New database connection created (total: {self._size})")
+        return connection
+
+    def _close_quietly(self, connection) -> None:
         try:
-            connection = self._get_connection()
-            connection.ping(reconnect=True)
+            connection.close()
         except Exception as e:
-            logger.warning(f"Connection lost: {e}. Reconnecting...")
-            self._close_connection()
-            self._get_connection()
+            logger.error(f"Error closing connection: {e}")
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def _evict_idle(self) -> List[Any]:
+        """Pop connections idle for longer than idle_timeout, keeping min_size open. Caller holds the lock."""
+        expired = []
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["evicted"] += 1
+            expired.append(connection)
+        return expired
+
+    def _acquire(self, timeout: Optional[float] = None):
+        """Borrow a connection, waiting up to `timeout` seconds when the pool is exhausted"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        connection = None
+        last_used = None
+
+        with self._cond:
+            self._check_fork()
+            expired = self._evict_idle()
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.pool_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(f"No database connection available within {timeout}s (pool size {self.pool_size})")
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+            generation = self._generation
+
+        for expired_connection in expired:
+            self._close_quietly(expired_connection)
+
+        try:
+            if connection is None:
+                connection = self._connect()
+            elif time.monotonic() - last_used > self.health_check_after:
+                # Health check on borrow
+                try:
+                    connection.ping(reconnect=False)
+                except Exception as e:
+                    logger.warning(f"Connection lost: {e}. Reconnecting...")
+                    with self._cond:
+                        self._stats["health_check_failures"] += 1
+                    self._close_quietly(connection)
+                    connection = self._connect()
+        except Exception as e:
+            logger.error(f"Database connection failed: {e}")
+            with self._cond:
+                if generation == self._generation:
+                    self._size -= 1
+                self._cond.notify()
+            raise
+
+        return connection, generation
+
+    def _release(self, connection, generation: int, discard: bool = False) -> None:
+        """Return a connection to the pool, or close it when broken / from a previous generation"""
+        with self._cond:
+            stale = generation != self._generation or self._pid != os.getpid()
+            if not stale and not discard and connection.open:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+                return
+            if not stale:
+                self._size -= 1
+            self._cond.notify()
+        if self._pid == os.getpid():
+            self._close_quietly(connection)
 
     @contextmanager
     def get_cursor(self):
-        """Context manager for database cursor with automatic retry"""
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
+        """Context manager for a cursor on a pooled connection"""
+        connection, generation = self._acquire()
+        discard = False
+        try:
+            with connection.cursor() as cursor:
+                yield cursor
+        except (pymysql.OperationalError, pymysql.InterfaceError):
+            # Connection is in an unknown state, do not hand it out again
+            discard = True
+            raise
+        finally:
+            self._release(connection, generation, discard)
+
+    async def execute_query(self, query: str, params: Optional[Tuple] = None, max_retries: int = 3) -> List[Tuple]:
+        """Execute query with automatic retry and connection management"""
+        for attempt in range(1, max_retries + 1):
             try:
-                self._ensure_connection()
-                connection = self._get_connection()
-                
-                with connection.cursor() as cursor:
-                    yield cursor
-                    break
-                    
+                with self.get_cursor() as cursor:
+                    if params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
+
+                    result = list(cursor.fetchall())
+                    logger.debug(f"Query returned {len(result)} rows")
+                    return result
+
             except (pymysql.OperationalError, pymysql.InterfaceError) as e:
-                retry_count += 1
-                logger.warning(f"Database error (attempt {retry_count}/{max_retries}): {e}")
-                
-                if retry_count >= max_retries:
+                logger.warning(f"Database error (attempt {attempt}/{max_retries}): {e}")
+                if attempt >= max_retries:
                     logger.error(f"Max retries reached for database operation")
+                    logger.error(f"Query: {query}")
+                    logger.error(f"Params: {params}")
                     raise
-                
-                # Force reconnection
-                self._close_connection()
-                import time
-                time.sleep(0.5 * retry_count)  # Exponential backoff
-                
+                await asyncio.sleep(0.5 * attempt)  # Linear backoff
+
             except Exception as e:
-                logger.error(f"Unexpected database error: {e}")
+                logger.error(f"Query execution failed: {e}")
+                logger.error(f"Query: {query}")
+                logger.error(f"Params: {params}")
                 raise
 
-    async def execute_query(self, query: str, params: Optional[Tuple] = None) -> List[Tuple]:
-        """Execute query with automatic retry and connection management"""
-        
-        try:
-            with self.get_cursor() as cursor:
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
-                
-                result = list(cursor.fetchall())
-                logger.debug(f"Query returned {len(result)} rows")
-                return result
-                
-        except Exception as e:
-            logger.error(f"Query execution failed: {e}")
-            logger.error(f"Query: {query}")
-            logger.error(f"Params: {params}")
-            raise
+    def pool_stats(self) -> Dict[str, int]:
+        """Pool size and counters since start (or since the last fork)"""
+        with self._cond:
+            return {
+                "max_size": self.pool_size,
+                "min_size": self.min_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                **self._stats,
+            }
 
     def close_all_connections(self):
-        """Close all connections (useful for cleanup)"""
-        self._close_connection()
+        """Close idle connections; checked-out ones are closed when returned (useful for cleanup)"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._generation += 1
+            # Checked-out connections now belong to an old generation
+            self._size = 0
+            self._cond.notify_all()
+        for connection in idle:
+            self._close_quietly(connection)
 
     def __del__(self):
-        self.close_all_connections()
+        try:
+            self.close_all_connections()
+        except Exception:
+            pass
+
+
+class Async_Database_Service:
+    """
+    aiomysql-backed counterpart of Database_Service with the same execute_query API.
+    Queries yield to the event loop while waiting on MySQL, so concurrent requests overlap.
+    The pool belongs to the event loop it was created on and is rebuilt for a new loop.
+    """
+
+    def __init__(self, db_params: Dict[str, Any], pool_size: int = 10,
+                 min_size: int = settings.db_pool_min_size,
+                 checkout_timeout: float = settings.db_pool_checkout_timeout,
+                 idle_timeout: float = settings.db_pool_idle_timeout,
+                 multi_statements: bool = False):
+        self.db_params = {"autocommit": True, **db_params}
+        if multi_statements:
+            # Allows execute_multi_query to send several statements in one round trip
+            self.db_params["client_flag"] = self.db_params.get("client_flag", 0) | CLIENT.MULTI_STATEMENTS
+        self.pool_size = pool_size
+        self.min_size = min(min_size, pool_size)
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+
+        self._pool: Optional[aiomysql.Pool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._pid = os.getpid()
+
+    async def _get_pool(self) -> aiomysql.Pool:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._pid != os.getpid():
+            # Pools cannot be shared between event loops or processes
+            self._discard_pool()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._pid = os.getpid()
+
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        minsize=self.min_size,
+                        maxsize=self.pool_size,
+                        pool_recycle=self.idle_timeout,
+                        **self.db_params
+                    )
+                    logger.info(f"Async database pool created (max: {self.pool_size})")
+        return self._pool
+
+    def _discard_pool(self) -> None:
+        if self._pool is None:
+            return
+        try:
+            if self._pid == os.getpid():
+                self._pool.terminate()
+        except Exception as e:
+            logger.warning(f"Error terminating async pool of a previous event loop: {e}")
+        self._pool = None
+
+    async def execute_query(self, query: str, params: Optional[Tuple] = None, max_retries: int = 3) -> List[Tuple]:
+        """Execute query with automatic retry and connection management"""
+        async def fetch(cursor) -> List[Tuple]:
+            result = list(await cursor.fetchall())
+            logger.debug(f"Query returned {len(result)} rows")
+            return result
+
+        return await self._execute(query, params, fetch, max_retries)
+
+    async def execute_multi_query(self, query: str, params: Optional[Tuple] = None, max_retries: int = 3) -> List[List[Tuple]]:
+        """
+        Execute several ;-separated statements in one round trip (needs multi_statements=True).
+        Returns the rows of every result set that has columns, in order; OK packets are skipped.
+        """
+        async def fetch(cursor) -> List[List[Tuple]]:
+            result_sets = []
+            while True:
+                if cursor.description is not None:
+                    result_sets.append(list(await cursor.fetchall()))
+                if not await cursor.nextset():
+                    break
+            logger.debug(f"Query returned {len(result_sets)} result sets")
+            return result_sets
+
+        return await self._execute(query, params, fetch, max_retries)
+
+    async def _execute(self, query: str, params: Optional[Tuple], fetch, max_retries: int):
+        for attempt in range(1, max_retries + 1):
+            try:
+                pool = await self._get_pool()
+                try:
+                    connection = await asyncio.wait_for(pool.acquire(), timeout=self.checkout_timeout)
+                except asyncio.TimeoutError:
+                    raise PoolTimeoutError(f"No database connection available within {self.checkout_timeout}s (pool size {self.pool_size})")
+
+                try:
+                    async with connection.cursor() as cursor:
+                        await cursor.execute(query, params or None)
+                        return await fetch(cursor)
+                except (pymysql.OperationalError, pymysql.InterfaceError):
+                    # Connection is in an unknown state, do not hand it out again
+                    connection.close()
+                    raise
+                finally:
+                    await pool.release(connection)
+
+            except (pymysql.OperationalError, pymysql.InterfaceError) as e:
+                logger.warning(f"Database error (attempt {attempt}/{max_retries}): {e}")
+                if attempt >= max_retries:
+                    logger.error(f"Max retries reached for database operation")
+                    logger.error(f"Query: {query}")
+                    logger.error(f"Params: {params}")
+                    raise
+                await asyncio.sleep(0.5 * attempt)  # Linear backoff
+
+            except Exception as e:
+                logger.error(f"Query execution failed: {e}")
+                logger.error(f"Query: {query}")
+                logger.error(f"Params: {params}")
+                raise
+
+    def pool_stats(self) -> Dict[str, int]:
+        if self._pool is None:
+            return {"max_size": self.pool_size, "min_size": self.min_size, "size": 0, "idle": 0, "in_use": 0}
+        return {
+            "max_size": self.pool_size,
+            "min_size": self.min_size,
+            "size": self._pool.size,
+            "idle": self._pool.freesize,
+            "in_use": self._pool.size - self._pool.freesize,
+        }
 
+    async def close(self) -> None:
+        """Close the pool gracefully (must run on the loop that owns it)"""
+        if self._pool is None:
+            return
+        pool = self._pool
+        self._pool = None
+        pool.close()
+        await pool.wait_closed()
+        logger.info("Async database pool closed")
@@ -0,0 +1,222 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from services.benchmark import AlignedBenchmark
+
+# Minimum number of bars before E1-E5 can be evaluated (SLOPE(Close, 66))
+MIN_BARS = 66
+
+RSI_PERIOD = 10
+STOCH_PERIOD = 10
+
+
+def rolling_max(values: List[float], window: int) -> List[float]:
+    """
+    max(values[max(0, i - window + 1):i + 1]) for every i, using a monotonic deque.
+    """
+    result = []
+    candidates = deque()
+    for i, value in enumerate(values):
+        while candidates and values[candidates[-1]] <= value:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        result.append(values[candidates[0]])
+    return result
+
+
+def rolling_min(values: List[float], window: int) -> List[float]:
+    """
+    min(values[max(0, i - window + 1):i + 1]) for every i, using a monotonic deque.
+    """
+    result = []
+    candidates = deque()
+    for i, value in enumerate(values):
+        while candidates and values[candidates[-1]] >= value:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        result.append(values[candidates[0]])
+    return result
+
+
+def wilder_rsi(prices: List[float], period: int) -> List[float]:
+    """
+    Wilder RSI for the whole series in one pass.
+    First valid value is at index `period` (SMA seed), NaN before it.
+    """
+    rsi_values = [float('nan')] * len(prices)
+    if len(prices) <= period:
+        return rsi_values
+
+    gains = []
+    losses = []
+    for i in range(1, len(prices)):
+        delta = prices[i] - prices[i-1]
+        gains.append(max(delta, 0))
+        losses.append(abs(min(delta, 0)))
+
+    # Calculate initial average (first period using SMA)
+    avg_gain = sum(gains[:period]) / period
+    avg_loss = sum(losses[:period]) / period
+    rsi_values[period] = _rsi(avg_gain, avg_loss)
+
+    # Continue with Wilder's Smoothing
+    for i in range(period, len(gains)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+        rsi_values[i + 1] = _rsi(avg_gain, avg_loss)
+
+    return rsi_values
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0:
+        return 100.0
+    rs = avg_gain / avg_loss
+    return 100.0 - (100.0 / (1.0 + rs))
+
+
+class EnergyEngine:
+    """
+    Computes every series E1-E5 depend on once per stock, so that evaluating
+    a single bar is O(1) instead of rebuilding RSI and window extremes per bar.
+    """
+
+    def __init__(self, close: List[float], high: List[float], low: List[float], string_dates: List[str],
+                 benchmark: AlignedBenchmark):
+        self.close = close
+        self.high = high
+        self.low = low
+        self.string_dates = string_dates
+        self.benchmark = benchmark
+
+        # E1: highest(high, 20), read one bar back
+        self.max_high_20 = rolling_max(high, 20)
+
+        # E2: StochRSI(10) - RSI series plus 10-bar extremes of the valid part
+        self.rsi = wilder_rsi(close, RSI_PERIOD)
+        valid_rsi = self.rsi[RSI_PERIOD:] if len(close) > RSI_PERIOD else []
+        self.rsi_max = [float('nan')] * (len(close) - len(valid_rsi)) + rolling_max(valid_rsi, STOCH_PERIOD)
+        self.rsi_min = [float('nan')] * (len(close) - len(valid_rsi)) + rolling_min(valid_rsi, STOCH_PERIOD)
+
+        # E5: 5-bar range and 250-bar high
+        self.min_low_5 = rolling_min(low, 5)
+        self.max_high_5 = rolling_max(high, 5)
+        self.max_high_250 = rolling_max(high, 250)
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    def flags(self, idx: int) -> Optional[Tuple[str, str, str, str, str]]:
+        """
+        E1-E5 for bar `idx` as "1"/"0" strings, None when there are fewer than 66 bars before it.
+        """
+        if idx < MIN_BARS:
+            return None
+
+        close = self.close
+        high = self.high
+        low = self.low
+
+        #####################################
+        # E1. New high in the past {20D} and close is higher than [Low + {0.65} * (High - Low)]
+        # high > highest(high, 20)[1] and
+        # close > (high - low) * 0.65 + low
+        max_high_20d = self.max_high_20[idx - 1]
+        if high[idx] > max_high_20d and close[idx] > (high[idx] - low[idx]) * 0.65 + low[idx]:
+            E1 = "1"
+        else:
+            E1 = "0"
+
+        #####################################
+        # E2. StochRSI(10) > 0.5
+        # _lewis_StochRSI(10) > 0.5
+        if idx - (STOCH_PERIOD - 1) >= RSI_PERIOD:
+            rsi_val = self.rsi[idx]
+            max_val = self.rsi_max[idx]
+            min_val = self.rsi_min[idx]
+            if max_val == min_val:
+                stochrsi = 0.0
+            else:
+                stochrsi = (rsi_val - min_val) / (max_val - min_val)
+            E2 = "1" if stochrsi > 0.5 else "0"
+        else:
+            E2 = "0"
+
+        #####################################
+        # E3. SLOPE(Close, {66}) > 0
+        # (close - close[66])/66
+        E3 = "1" if (close[idx] - close[idx - 66]) / 66 > 0 else "0"
+
+        #####################################
+        # E4. Price change over 33 days outperforming SPY
+        # close/close[33] > close data(2)/close[33] data(2)
+        arr_idx = self.benchmark.position(self.string_dates[idx])
+        if arr_idx is not None and idx >= 33 and arr_idx >= 33:
+            stock_performance = close[idx] / close[idx - 33]
+            spy_performance = self.benchmark.ratio(arr_idx, 33)
+            E4 = "1" if stock_performance > spy_performance else "0"
+        else:
+            E4 = "0"
+
+        #####################################
+        # E5. Latest price is at top half of 5-day range and current price > price of 5 days ago
+        # and current price is less than 7% drawdown from 250D high
+        # (close - lowest(low, 5))/(highest(high, 5) - lowest(low, 5)) > 0.5
+        # close - close[5] > 0
+        # (highest(high, 250) - close)/highest(high, 250) < 0.07
+        min5 = self.min_low_5[idx]
+        max5 = self.max_high_5[idx]
+        max250 = self.max_high_250[idx]
+
+        condition1 = (close[idx] - min5) / (max5 - min5) > 0.5 if max5 != min5 else False
+        condition2 = close[idx] - close[idx - 5] > 0
+        condition3 = (max250 - close[idx]) / max250 < 0.07 if max250 != 0 else False
+
+        E5 = "1" if condition1 and condition2 and condition3 else "0"
+
+        return E1, E2, E3, E4, E5
+
+
+# Days in the HK signal energy score window, and the flags counted for each day
+ENERGY_WINDOW_DAYS = 16
+ENERGY_KEYS = ("E1", "E2", "E3", "E4", "E5")
+
+
+class EnergyWindow:
+    """
+    The last ENERGY_WINDOW_DAYS days of E1-E5 with running counts of the "1" and valid
+    ("0"/"1") flags, so the energy score follows the window in O(1) per pushed day.
+    """
+
+    def __init__(self, size: int = ENERGY_WINDOW_DAYS):
+        self.days = deque(maxlen=size)
+        self.ones = 0
+        self.valid = 0
+
+    def push(self, indicator: Dict[str, str]) -> None:
+        """Append one day's indicators ({'E1': ..., 'E5': ...}), dropping the oldest day when full"""
+        if len(self.days) == self.days.maxlen:
+            self._count(self.days[0], -1)
+        self.days.append(indicator)
+        self._count(indicator, 1)
+
+    def _count(self, indicator: Dict[str, str], sign: int) -> None:
+        for key in ENERGY_KEYS:
+            value = indicator[key]
+            if value == "1":
+                self.ones += sign
+            if value in ("0", "1"):
+                self.valid += sign
+
+    @property
+    def score(self) -> float:
+        """Sum of E1-E5 over the window divided by 80 (16 days x 5 flags)"""
+        return self.ones / (self.days.maxlen * len(ENERGY_KEYS)) if self.valid > 0 else 0
+
+    @property
+    def latest(self) -> Dict[str, str]:
+        return self.days[-1]
@@ -1,5 +1,8 @@
 import csv
 import os
+import shutil
+import socket
+from typing import Dict, List, Tuple
 
 from config.settings import Settings
 from config.logger import setup_logger
@@ -66,4 +69,74 @@ class FileService:
             return data
         except Exception as e:
             logger.error(f"Error reading CSV file {file_path}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+
+class ShardedCsvWriter:
+    """
+    Worker-side writer for the signal CSVs. Every process appends to its own shard
+    (<data>/shards/<file_name>/<host>-<pid>.csv), so prefork workers never interleave rows
+    in a shared file. Rows are buffered and written with one open per shard on flush();
+    merge() moves all shards into <file_name>.csv once the fan-out has finished.
+    """
+
+    def __init__(self, data_dir: str = None):
+        self.data_dir = data_dir or Settings().base_path
+        self._buffers: Dict[str, Tuple[List[str], List[Dict]]] = {}
+
+    def shard_dir(self, file_name: str) -> str:
+        return os.path.join(self.data_dir, "shards", file_name)
+
+    def write(self, file_name: str, data: list, fieldnames: list):
+        """Buffer rows for `file_name`; they reach the shard on flush()"""
+        if data:
+            self._buffers.setdefault(file_name, (fieldnames, []))[1].extend(data)
+
+    def flush(self):
+        """Append buffered rows to this process' shards"""
+        buffers, self._buffers = self._buffers, {}
+        for file_name, (fieldnames, rows) in buffers.items():
+            shard_dir = self.shard_dir(file_name)
+            os.makedirs(shard_dir, exist_ok=True)
+            shard_path = os.path.join(shard_dir, f"{socket.gethostname()}-{os.getpid()}.csv")
+            with open(shard_path, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                if csvfile.tell() == 0:
+                    writer.writeheader()
+                writer.writerows(rows)
+            logger.info(f"Flushed {len(rows)} rows to {shard_path}")
+
+    def merge(self, file_name: str, fieldnames: list) -> int:
+        """Append every shard of `file_name` to <file_name>.csv and remove them; returns the number of shards merged"""
+        shard_dir = self.shard_dir(file_name)
+        if not os.path.isdir(shard_dir):
+            return 0
+
+        merged = 0
+        file_path = f"{self.data_dir}/{file_name}.csv"
+        with open(file_path, 'a', newline='', encoding='utf-8') as target:
+            if target.tell() == 0:
+                csv.DictWriter(target, fieldnames=fieldnames).writeheader()
+            for name in sorted(os.listdir(shard_dir)):
+                if name.endswith(".csv"):
+                    # A worker still writing after the rename starts a new shard instead of losing rows
+                    merging_path = os.path.join(shard_dir, name + ".merging")
+                    os.replace(os.path.join(shard_dir, name), merging_path)
+                elif name.endswith(".merging"):
+                    # Left by an interrupted merge
+                    merging_path = os.path.join(shard_dir, name)
+                else:
+                    continue
+                with open(merging_path, 'r', newline='', encoding='utf-8') as shard:
+                    shard.readline()  # header
+                    shutil.copyfileobj(shard, target)
+                os.remove(merging_path)
+                merged += 1
+
+        logger.info(f"Merged {merged} shards into {file_path}")
+        return merged
+
+    def clear(self, file_name: str):
+        """Drop shards of `file_name` left by a previous run"""
+        self._buffers.pop(file_name, None)
+        shutil.rmtree(self.shard_dir(file_name), ignore_errors=True)
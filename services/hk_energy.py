@@ -8,12 +8,29 @@ from config.logger import setup_logger
 from config.settings import Settings
 
 from models.schemas import EnergyStockRecord
+from services.benchmark import AlignedBenchmark, get_aligned_benchmark, records_fingerprint
+from services.energy_engine import EnergyEngine
+from services.price_loader import PriceWindow
 
 settings = Settings()
 algo_logger = setup_logger("energy_algo")
 logger = algo_logger
 
 
+# Months of history the algorithm reads before the trade day
+HISTORY_MONTHS = 24
+
+# Row positions used by prepare_stock_data: open, high, low, close, volume
+ENERGY_COLUMNS = (4, 7, 10, 13, 16)
+
+
+def energy_price_window(trade_day: str) -> PriceWindow:
+    """History HK Energy reads for `trade_day`: the last 24 months up to it"""
+    in_date = datetime.strptime(trade_day, "%Y-%m-%d")
+    load_data_date = in_date - relativedelta(months=HISTORY_MONTHS)
+    return PriceWindow(end_date=trade_day, start_date=load_data_date.strftime("%Y-%m-%d"), columns=ENERGY_COLUMNS)
+
+
 # Constants for file paths
 # DATA_DIR = settings.base_path
 # SIGNAL_FILE_NAME = settings.signal_file_name
@@ -29,7 +46,7 @@ class HK_Energy_Algo:
             logger.info(f"stock_data_2800: {len(stock_data_2800)}")
 
             in_date = datetime.strptime(trade_day, "%Y-%m-%d")
-            load_data_date = in_date - relativedelta(months=24)
+            load_data_date = in_date - relativedelta(months=HISTORY_MONTHS)
             logger.info(f"load_data_date algo for: {load_data_date}")
             
             if self.is_running:
@@ -41,172 +58,46 @@ class HK_Energy_Algo:
             self.is_running = True
 
             processed_data = self._process_stock_data(stock_data, load_data_date)
-            processed_data_spy = self._process_stock_data(stock_data_2800, load_data_date)
+
+            # 2800 is aligned once per trade day and reused by every stock
+            benchmark = get_aligned_benchmark(
+                ("energy", trade_day) + records_fingerprint(stock_data_2800),
+                lambda: self._build_benchmark(stock_data_2800, load_data_date)
+            )
             
             close = processed_data['close']
             high = processed_data['high']
             low = processed_data['low']
             ddate = processed_data['dates']
             sdate = processed_data['string_dates']
-            
-            # SPY (reference data) arrays
-            close_spy = processed_data_spy['close']
-            sdate_spy = processed_data_spy['string_dates']
-            
-            idx = 0
-            arr_idx = 0
-            E1, E2, E3, E4, E5 = "", "", "", "", ""
-            
+
+            engine = EnergyEngine(close, high, low, sdate, benchmark)
+
             all_indicators = []
-            
+
             for idx in range(len(close)):
                 # islatest
                 is_latest = "1" if idx == len(close) - 1 else "\\N"
-                
-                # skip the bars before in_date
-                
+
+                # If ddate(idx) >= in_date Or islatest = "1" Then
                 if not (ddate[idx] >= in_date or is_latest == "1"):
                     continue
-                
-                if idx >= 66: #with at least 66 bars for calculation
-                    
-                    #####################################
-                    # E1. New high in the past {20D} and close is higher than [Low + {0.65} * (High - Low)]
-                    # high > highest(high, 20)[1] and
-                    # close > (high - low) * 0.65 + low
-                    
-                    # Calculate max high in the past 20 days (not including current bar)
-                    # idx - 1 --> not to include the high of the last bar
-                    start_idx = max(0, idx - 20)
-                    end_idx = idx - 1  # not including current bar
-                    
-                    if end_idx >= start_idx:
-                        max_high_20d = max(high[start_idx:end_idx + 1])
-                    else:
-                        max_high_20d = 0
-                    
-                    # Check E1 conditions
-                    if (high[idx] > max_high_20d and 
-                        close[idx] > (high[idx] - low[idx]) * 0.65 + low[idx]):
-                        E1 = "1"
-                    else:
-                        E1 = "0"
-                    
-                    #####################################
-                    # E2. StochRSI(10) > 0.5
-                    # _lewis_StochRSI(10) > 0.5
-
-                    period_rsi = 10
-                    period_stoch = 10
-                    
-                    if idx >= (period_rsi + period_stoch - 1):
-                        rsi_values = self._calculate_rsi(close, idx, period_rsi)
-                    
-                        rsi_val = rsi_values[idx]
-                    
-                        start_pos = idx - (period_stoch - 1)
-                        end_pos = idx + 1
-                    
-                        window = [v for v in rsi_values[start_pos:end_pos] if not (v != v)]
-                        if len(window) == period_stoch:
-                            max_val = max(window)
-                            min_val = min(window)
-                            if max_val == min_val:
-                                stochrsi = 0.0
-                            else:
-                                stochrsi = (rsi_val - min_val) / (max_val - min_val)
-                            E2 = "1" if stochrsi > 0.5 else "0"
-                        else:
-                            E2 = "0"
-                    else:
-                        E2 = "0"
 
-                    #####################################
-                    # E3. SLOPE(Close, {66}) > 0
-                    # (close - close[66])/66
+                # with at least 66 bars for calculation
+                flags = engine.flags(idx)
+                E1, E2, E3, E4, E5 = flags if flags is not None else ("\\N",) * 5
 
-                    if (close[idx] - close[idx - 66]) / 66 > 0:
-                        E3 = "1"
-                    else:
-                        E3 = "0"
-
-                    #####################################
-                    # E4. Price change over 33 days outperforming SPY
-                    # close/close[33] > close data(2)/close[33] data(2)
-                    
-                    # Find matching date in SPY data
-                    try:
-                        arr_idx = sdate_spy.index(sdate[idx])
-                        
-                        # Check if we have enough data (33 days back) for both stock and SPY
-                        if (idx >= 33 and arr_idx >= 33 and 
-                            arr_idx < len(close_spy) and idx < len(close)):
-                            
-                            stock_performance = close[idx] / close[idx - 33]
-                            spy_performance = close_spy[arr_idx] / close_spy[arr_idx - 33]
-                            
-                            if stock_performance > spy_performance:
-                                E4 = "1"
-                            else:
-                                E4 = "0"
-                        else:
-                            E4 = "0" 
-                            
-                    except ValueError:
-                        E4 = "0"
-                    
-                    #####################################
-                    # E5. Latest price is at top half of 5-day range and current price > price of 5 days ago 
-                    # and current price is less than 7% drawdown from 66D high
-                    # (close - lowest(low, 5))/(highest(high, 5) - lowest(low, 5)) > 0.5
-                    # close - close[5] > 0
-                    # (highest(high, 66) - close)/highest(high, 66) < 0.07
-                    
-                    # Check if we have enough data for all calculations
-                        
-                    # lowest(low, 5) - get min low of last 5 days including current
-                    start_idx_5 = max(0, idx - 4)  # Last 5 days including current
-                    min5 = min(low[start_idx_5:idx + 1])
-                        
-                    # highest(high, 5) - get max high of last 5 days including current
-                    max5 = max(high[start_idx_5:idx + 1])
-                        
-                    # lowest(low, 250) - get min low of last 250 days including current
-                    start_idx_250 = max(0, idx - 249)  # Last 250 days including current
-                        
-                    # highest(high, 250) - get max high of last 250 days including current
-                    max250 = max(high[start_idx_250:idx + 1])
-                        
-                    # Check all three E5 conditions
-                    condition1 = (close[idx] - min5) / (max5 - min5) > 0.5 if max5 != min5 else False
-                    condition2 = close[idx] - close[idx - 5] > 0 if idx >= 5 else False
-                    condition3 = (max250 - close[idx]) / max250 < 0.07 if max250 != 0 else False
-                        
-                    if condition1 and condition2 and condition3:
-                        E5 = "1"
-                    else:
-                        E5 = "0"
-                        
-                else:
-                    E1 = "\\N"
-                    E2 = "\\N"
-                    E3 = "\\N"
-                    E4 = "\\N"
-                    E5 = "\\N"
-                
-                # If ddate(idx) >= in_date Or islatest = "1" Then
-                if ddate[idx] >= in_date or is_latest == "1":
-                    # Store indicators for this record
-                    all_indicators.append({
-                        "stock_code": stockname,
-                        "date": sdate[idx],
-                        "E1": E1,
-                        "E2": E2,
-                        "E3": E3,
-                        "E4": E4,
-                        "E5": E5,
-                        "is_latest": is_latest
-                    })
+                # Store indicators for this record
+                all_indicators.append({
+                    "stock_code": stockname,
+                    "date": sdate[idx],
+                    "E1": E1,
+                    "E2": E2,
+                    "E3": E3,
+                    "E4": E4,
+                    "E5": E5,
+                    "is_latest": is_latest
+                })
             
             # Generate CSV content from all_indicators for file saving
             # if all_indicators:
@@ -241,6 +132,10 @@ class HK_Energy_Algo:
         finally:
             self.is_running = False
     
+    def _build_benchmark(self, stock_data_2800: List[EnergyStockRecord], load_data_date: datetime) -> AlignedBenchmark:
+        processed_data_spy = self._process_stock_data(stock_data_2800, load_data_date)
+        return AlignedBenchmark(processed_data_spy['string_dates'], processed_data_spy['close'])
+
     def _process_stock_data(self, stock_data: List[EnergyStockRecord], load_data_date: datetime) -> Dict[str, Any]:
 
         ldate = []
@@ -290,56 +185,5 @@ class HK_Energy_Algo:
             'volume': lvolume
         }
     
-    def _calculate_rsi(self, prices: List[float], current_idx: int, period: int) -> List[float]:
-        if current_idx < period:
-            return [float('nan')] * (current_idx + 1)
-    
-        price_data = prices[:current_idx + 1]
-        rsi_values = [float('nan')] * len(price_data)  # Initialize with NaN
-    
-        # Calculate price changes
-        deltas = []
-        for i in range(1, len(price_data)):
-            deltas.append(price_data[i] - price_data[i-1])
-        
-        if len(deltas) < period:
-            return rsi_values
-        
-        # Separate gains and losses
-        gains = [max(delta, 0) for delta in deltas]
-        losses = [abs(min(delta, 0)) for delta in deltas]
-        
-        # Calculate initial average (first period using SMA)
-        initial_avg_gain = sum(gains[:period]) / period
-        initial_avg_loss = sum(losses[:period]) / period
-        
-        # Calculate first RSI at index 'period'
-        if initial_avg_loss == 0:
-            rsi = 100.0
-        else:
-            rs = initial_avg_gain / initial_avg_loss
-            rsi = 100.0 - (100.0 / (1.0 + rs))
-        
-        rsi_values[period] = rsi  # First valid RSI at index 'period'
-        
-        # Continue with Wilder's Smoothing
-        avg_gain = initial_avg_gain
-        avg_loss = initial_avg_loss
-        
-        for i in range(period, len(deltas)):  # Start from period, not period+1
-            # Wilder's Smoothing
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-            
-            if avg_loss == 0:
-                rsi = 100.0
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100.0 - (100.0 / (1.0 + rs))
-            
-            rsi_values[i + 1] = rsi  # RSI for price at index i+1
-        
-        return rsi_values
-    
-    
+
 HK_Energy_TA = HK_Energy_Algo()
@@ -0,0 +1,90 @@
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, List, Sequence
+
+
+def is_finite(value):
+    """Check if value is finite (not NaN, not inf, not -inf)"""
+    return value == value and value != float('inf') and value != float('-inf')
+
+
+def num(value, name):
+    try:
+        n = float(value)
+        if not is_finite(n):
+            raise ValueError(f"Field {name} must be a number.")
+        return n
+    except (ValueError, TypeError):
+        raise ValueError(f"Field {name} must be a number.")
+
+
+def timestamp_ms(value) -> float:
+    """
+    Epoch milliseconds of a bar / buy date (datetime, date, ISO string or epoch milliseconds).
+    Bars are matched on the full timestamp, so a time part or time zone counts as it always did.
+    """
+    if isinstance(value, datetime):
+        return value.timestamp() * 1000
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        if isinstance(value, str):
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        else:
+            dt = datetime.fromisoformat(str(value))
+        return dt.timestamp() * 1000
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid date: {value}")
+
+
+class BarSeries:
+    """
+    One symbol's daily bars as parallel arrays, sorted by date and validated once.
+    `stamps` holds epoch milliseconds; close / high / low are finite floats. `open` is
+    kept as given: only S7 / S8 read it, on the last bars, and validate it there.
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, stamps: List[float], dates: List[Any], open: List[Any], high: List[float],
+                 low: List[float], close: List[float], volume: List[float]):
+        self.stamps = stamps
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_bars(cls, bars: Sequence[Any]) -> "BarSeries":
+        keyed = sorted(((timestamp_ms(bar.date), i) for i, bar in enumerate(bars)))
+        ordered = [bars[i] for _, i in keyed]
+        return cls(
+            stamps=[stamp for stamp, _ in keyed],
+            dates=[bar.date for bar in ordered],
+            open=[bar.open for bar in ordered],
+            # Validated in the order the conditions first read them (S4 close, S6 high, S7 low)
+            close=[num(bar.close, 'close') for bar in ordered],
+            high=[num(bar.high, 'high') for bar in ordered],
+            low=[num(bar.low, 'low') for bar in ordered],
+            # Not read by the conditions, so a missing volume is not an error
+            volume=[float(bar.volume) if getattr(bar, 'volume', None) is not None else float('nan') for bar in ordered],
+        )
+
+    def __len__(self) -> int:
+        return len(self.stamps)
+
+    def values(self, field: str) -> List[float]:
+        if field not in self.FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        if field == 'open':
+            return [num(value, 'open') for value in self.open]
+        return getattr(self, field)
+
+    def index_of(self, value) -> int:
+        """Index of the bar dated `value`, else of the first bar after it"""
+        idx = bisect_left(self.stamps, timestamp_ms(value))
+        if idx == len(self.stamps):
+            raise ValueError("Buy date is outside data range.")
+        return idx
@@ -1,5 +1,6 @@
 from typing import List, Dict, Optional, Union
 from dataclasses import dataclass
+from services.hk_signal.indicators import IndicatorContext, atr, bollinger_bands, sma
 
 @dataclass
 class OHLCV:
@@ -10,51 +11,6 @@ class OHLCV:
     close: float
     volume: Optional[float] = None
 
-def sma(values: List[float], period: int) -> List[float]:
-    if len(values) < period:
-        return []
-    
-    result = []
-    for i in range(period - 1, len(values)):
-        window = values[i - period + 1:i + 1]
-        result.append(sum(window) / period)
-    return result
-
-def bollinger_bands(values: List[float], period: int, std_dev: float) -> List[Dict[str, float]]:
-    if len(values) < period:
-        return []
-    
-    result = []
-    for i in range(period - 1, len(values)):
-        window = values[i - period + 1:i + 1]
-        mean_val = sum(window) / period
-        variance = sum((x - mean_val) ** 2 for x in window) / period
-        std = variance ** 0.5
-        
-        result.append({
-            'upper': mean_val + std_dev * std,
-            'middle': mean_val,
-            'lower': mean_val - std_dev * std
-        })
-    return result
-
-def atr(highs: List[float], lows: List[float], closes: List[float], period: int) -> List[float]:
-    if len(highs) < period + 1:
-        return []
-    
-    true_ranges = []
-    for i in range(1, len(highs)):
-        tr1 = highs[i] - lows[i]
-        tr2 = abs(highs[i] - closes[i-1])
-        tr3 = abs(lows[i] - closes[i-1])
-        true_ranges.append(max(tr1, tr2, tr3))
-    
-    result = []
-    for i in range(period - 1, len(true_ranges)):
-        window = true_ranges[i - period + 1:i + 1]
-        result.append(sum(window) / period)
-    return result
-
 def linear_regression_slope(values: List[float]) -> float:
     n = len(values)
     if n < 2:
@@ -74,21 +30,20 @@ def linear_regression_slope(values: List[float]) -> float:
     
     return numerator / denominator if denominator != 0 else 0.0
 
-def checkB1(ohlcv: List[OHLCV]) -> bool:
+def checkB1(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if len(ohlcv) < 51:
         return False
 
-    closes = [bar.close for bar in ohlcv]
-    highs = [bar.high for bar in ohlcv]
+    ctx = ctx or IndicatorContext(ohlcv)
     last = ohlcv[-1]
 
     if len(ohlcv) < 21:
         return False
-    prev20High = max(highs[-21:-1])
+    prev20High = ctx.range_max('high', -21, -1)
     condNewHigh = last.high > prev20High
 
-    bb = bollinger_bands(closes, 51, 1.9)
-    sma51 = sma(closes, 51)
+    bb = ctx.bollinger('close', 51, 1.9)
+    sma51 = ctx.sma('close', 51)
 
     condBoll = False
     if bb and sma51:
@@ -102,19 +57,18 @@ def checkB1(ohlcv: List[OHLCV]) -> bool:
 
     return (condNewHigh or condBoll) and condCloseInUpperRange
 
-def checkB3(ohlcv: List[OHLCV]) -> bool:
+def checkB3(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if not ohlcv:
         return False
 
-    closes = [bar.close for bar in ohlcv]
-
-    bb = bollinger_bands(closes, 21, 2)
+    ctx = ctx or IndicatorContext(ohlcv)
+    bb = ctx.bollinger('close', 21, 2)
     if len(bb) < 72 + 58:
         return False
 
-    bbw = [(x['upper'] - x['lower']) / x['middle'] for x in bb]
+    bbw = ctx.memo(('bbw', 'close', 21, 2), lambda: [(x['upper'] - x['lower']) / x['middle'] for x in bb])
 
-    smaBBW = sma(bbw, 72)
+    smaBBW = ctx.memo(('sma', 'bbw', 72), lambda: sma(bbw, 72))
     if len(smaBBW) < 58:
         return False
 
@@ -123,35 +77,30 @@ def checkB3(ohlcv: List[OHLCV]) -> bool:
 
     return slope < 0
 
-def checkB8(ohlcv: List[OHLCV]) -> bool:
+def checkB8(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if len(ohlcv) < 270:
         return False
 
-    lows = [bar.low for bar in ohlcv]
+    ctx = ctx or IndicatorContext(ohlcv)
 
-    recent46Low = min(lows[-46:])
+    recent46Low = ctx.lowest('low', 46)
 
-    pastRange = lows[-270:-46]
-    pastMin = min(pastRange)
+    pastMin = ctx.range_min('low', -270, -46)
 
     return recent46Low > pastMin
 
-def checkB9(ohlcv: List[OHLCV]) -> bool:
+def checkB9(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if len(ohlcv) < 50:
         return False
 
-    last50 = ohlcv[-50:]
-    closes = [bar.close for bar in last50]
-    highs = [bar.high for bar in last50]
-    lows = [bar.low for bar in last50]
-
-    lastClose = closes[-1]
+    ctx = ctx or IndicatorContext(ohlcv)
+    lastClose = ctx.values('close')[-1]
 
-    maxHigh = max(highs)
-    minLow = min(lows)
+    highIndex = ctx.argmax('high', -50, None)
+    lowIndex = ctx.argmin('low', -50, None)
 
-    highIndex = highs.index(maxHigh)
-    lowIndex = lows.index(minLow)
+    maxHigh = ctx.values('high')[highIndex]
+    minLow = ctx.values('low')[lowIndex]
 
     mid = (maxHigh + minLow) / 2
 
@@ -160,29 +109,23 @@ def checkB9(ohlcv: List[OHLCV]) -> bool:
 
     return not (condCloseBelowMid and condHighEarlierThanLow)
 
-def checkB10(ohlcv: List[OHLCV]) -> bool:
+def checkB10(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if len(ohlcv) < 250:
         return False
 
-    last250 = ohlcv[-250:]
-    lows = [bar.low for bar in last250]
+    ctx = ctx or IndicatorContext(ohlcv)
+    minIndex = ctx.argmin('low', -250, None)
 
-    minLow = min(lows)
-    minIndex = lows.index(minLow)
-
-    daysSinceLow = len(last250) - 1 - minIndex
+    daysSinceLow = len(ohlcv) - 1 - minIndex
 
     return daysSinceLow > 68
 
-def checkB11(ohlcv: List[OHLCV]) -> bool:
+def checkB11(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if len(ohlcv) < 126 + 22:
         return False
 
-    highs = [bar.high for bar in ohlcv]
-    lows = [bar.low for bar in ohlcv]
-    closes = [bar.close for bar in ohlcv]
-
-    atr22 = atr(highs, lows, closes, 22)
+    ctx = ctx or IndicatorContext(ohlcv)
+    atr22 = ctx.atr(22)
     if len(atr22) < 126:
         return False
 
@@ -194,7 +137,8 @@ def checkB11(ohlcv: List[OHLCV]) -> bool:
     return not (currentATR > 0.87 * maxATR)
 
 def checkB12(ohlcv: List[OHLCV], targetDate: str, input_B12_growth: float = 0.16, 
-             input_B12_days: int = 50, input_B12_deviation: float = 0.2) -> bool:
+             input_B12_days: int = 50, input_B12_deviation: float = 0.2,
+             ctx: Optional[IndicatorContext] = None) -> bool:
     targetIndex = next((i for i, bar in enumerate(ohlcv) if bar.date == targetDate), -1)
     if targetIndex == -1:
         raise ValueError(f"Дата {targetDate} не знайдена")
@@ -202,9 +146,10 @@ def checkB12(ohlcv: List[OHLCV], targetDate: str, input_B12_growth: float = 0.16
     if targetIndex < 150 + input_B12_days:
         return False
 
-    smaNow = average([bar.close for bar in ohlcv[targetIndex - 150:targetIndex]])
+    closes = (ctx or IndicatorContext(ohlcv)).values('close')
+    smaNow = average(closes[targetIndex - 150:targetIndex])
 
-    smaPast = average([bar.close for bar in ohlcv[targetIndex - input_B12_days - 150:targetIndex - input_B12_days]])
+    smaPast = average(closes[targetIndex - input_B12_days - 150:targetIndex - input_B12_days])
 
     smaGrowth = (smaNow - smaPast) / smaPast
 
@@ -253,20 +198,18 @@ def checkB13(ohlcvStock: List[OHLCV], ohlcvIndex: List[OHLCV], periods: List[int
 
     return not underperformAll
 
-def checkB18(ohlcv: List[OHLCV]) -> bool:
+def checkB18(ohlcv: List[OHLCV], ctx: Optional[IndicatorContext] = None) -> bool:
     if not ohlcv or len(ohlcv) < 250:
         return False
 
-    closes = [bar.close for bar in ohlcv]
-    highs = [bar.high for bar in ohlcv]
-    lows = [bar.low for bar in ohlcv]
+    ctx = ctx or IndicatorContext(ohlcv)
 
     last = ohlcv[-1]
     lastClose = last.close
 
-    sma50 = sma(closes, 50)
-    sma150 = sma(closes, 150)
-    sma200 = sma(closes, 200)
+    sma50 = ctx.sma('close', 50)
+    sma150 = ctx.sma('close', 150)
+    sma200 = ctx.sma('close', 200)
 
     if not sma50 or not sma150 or not sma200:
         return False
@@ -284,12 +227,12 @@ def checkB18(ohlcv: List[OHLCV]) -> bool:
     cond4 = lastSMA50 > lastSMA150 and lastSMA50 > lastSMA200
     cond5 = lastClose > lastSMA50
 
-    last250High = max(highs[-250:])
-    last250Low = min(lows[-250:])
+    last250High = ctx.highest('high', 250)
+    last250Low = ctx.lowest('low', 250)
     cond6 = lastClose >= last250Low * 1.30
     cond7 = lastClose >= last250High * 0.75
 
-    bb21 = bollinger_bands(closes, 21, 2)
+    bb21 = ctx.bollinger('close', 21, 2)
     if len(bb21) < 82:
         return False
     bbw = [b['upper'] - b['lower'] for b in bb21]
@@ -304,19 +247,17 @@ def mean(arr: List[float]) -> float:
     return sum(arr) / len(arr) if arr else 0.0
 
 def calcS1Stop(ohlcv: List[OHLCV], factor: float = 3.7, atrPeriod: int = 22, 
-               entryClose: Optional[float] = None) -> float:
+               entryClose: Optional[float] = None, ctx: Optional[IndicatorContext] = None) -> float:
     if not ohlcv or len(ohlcv) < atrPeriod + 1:
         return float('nan')
 
-    highs = [bar.high for bar in ohlcv]
-    lows = [bar.low for bar in ohlcv]
-    closes = [bar.close for bar in ohlcv]
+    ctx = ctx or IndicatorContext(ohlcv)
 
-    close = entryClose if entryClose is not None else closes[-1]
+    close = entryClose if entryClose is not None else ctx.values('close')[-1]
     if close <= 0:
         return float('nan')
 
-    atrSeries = atr(highs, lows, closes, atrPeriod)
+    atrSeries = ctx.atr(atrPeriod)
     if not atrSeries:
         return float('nan')
     currentATR = atrSeries[-1]
@@ -331,18 +272,21 @@ def calcS1Stop(ohlcv: List[OHLCV], factor: float = 3.7, atrPeriod: int = 22,
         return round(close * (1 - 0.095), 4)   
     return round(baseStop, 4)
 
-def runAllBuyConditions(ohlcv: List[OHLCV], targetDate: str, spyData: List[OHLCV]) -> Dict[str, Union[bool, float]]:
+def runAllBuyConditions(ohlcv: List[OHLCV], targetDate: str, spyData: List[OHLCV],
+                        ctx: Optional[IndicatorContext] = None) -> Dict[str, Union[bool, float]]:
+    # One context per request: BB21, ATR22, SMA150, 250-bar extremes... are computed once
+    ctx = ctx or IndicatorContext(ohlcv)
     return {
-        'B1': checkB1(ohlcv),
-        'B3': checkB3(ohlcv),
-        'B8': checkB8(ohlcv),
-        'B9': checkB9(ohlcv),
-        'B10': checkB10(ohlcv),
-        'B11': checkB11(ohlcv),
-        'B12': checkB12(ohlcv, targetDate),
+        'B1': checkB1(ohlcv, ctx),
+        'B3': checkB3(ohlcv, ctx),
+        'B8': checkB8(ohlcv, ctx),
+        'B9': checkB9(ohlcv, ctx),
+        'B10': checkB10(ohlcv, ctx),
+        'B11': checkB11(ohlcv, ctx),
+        'B12': checkB12(ohlcv, targetDate, ctx=ctx),
         'B13': checkB13(ohlcv, spyData),
-        'B18': checkB18(ohlcv),
-        'stopLoss': calcS1Stop(ohlcv)
+        'B18': checkB18(ohlcv, ctx),
+        'stopLoss': calcS1Stop(ohlcv, ctx=ctx)
     }
 
 def isBuy(signals: Dict[str, Union[bool, float]]) -> bool:
@@ -0,0 +1,152 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from services.hk_signal.bar_series import BarSeries
+
+
+def sma(values: List[float], period: int) -> List[float]:
+    if period <= 0 or len(values) < period:
+        return []
+
+    # Each window is summed on its own: running sums drift by ~1e-12 and flip
+    # exact comparisons; IndicatorContext memoises the series instead
+    return [sum(values[i - period + 1:i + 1]) / period for i in range(period - 1, len(values))]
+
+def bollinger_bands(values: List[float], period: int, std_dev: float) -> List[Dict[str, float]]:
+    if period <= 0 or len(values) < period:
+        return []
+
+    result = []
+    for i in range(period - 1, len(values)):
+        window = values[i - period + 1:i + 1]
+        mean_val = sum(window) / period
+        std = (sum((x - mean_val) ** 2 for x in window) / period) ** 0.5
+
+        result.append({
+            'upper': mean_val + std_dev * std,
+            'middle': mean_val,
+            'lower': mean_val - std_dev * std
+        })
+    return result
+
+def true_ranges(highs: List[float], lows: List[float], closes: List[float]) -> List[float]:
+    trs = []
+    for i in range(1, len(highs)):
+        tr1 = highs[i] - lows[i]
+        tr2 = abs(highs[i] - closes[i-1])
+        tr3 = abs(lows[i] - closes[i-1])
+        trs.append(max(tr1, tr2, tr3))
+    return trs
+
+def atr(highs: List[float], lows: List[float], closes: List[float], period: int) -> List[float]:
+    if len(highs) < period + 1:
+        return []
+    return sma(true_ranges(highs, lows, closes), period)
+
+
+class RangeExtremes:
+    """
+    Sparse table of positions over one series: the first max (or min) of any values[lo:hi]
+    in O(1) after an O(n log n) build, as max / min and list.index would find it.
+    A series holding NaN is scanned with the builtins instead, so NaN is handled as before.
+    """
+
+    def __init__(self, values: List[float], pick_max: bool = True):
+        self.values = values
+        self.pick_max = pick_max
+        self.op = max if pick_max else min
+        self.array = array = np.asarray(values, dtype=float)
+        self.scan = bool(np.isnan(array).any())
+        # levels[k][i] is the position of the first extreme of values[i:i + 2**k]
+        level = np.arange(len(values))
+        self.levels = [level]
+        width = 1
+        while not self.scan and width * 2 <= len(values):
+            left, right = level[:-width], level[width:]
+            better = array[right] > array[left] if pick_max else array[right] < array[left]
+            level = np.where(better, right, left)
+            self.levels.append(level)
+            width *= 2
+
+    def index(self, lo: Optional[int], hi: Optional[int]) -> int:
+        """Index of the first extreme of values[lo:hi] (slice semantics, negative bounds allowed)"""
+        lo, hi, _ = slice(lo, hi).indices(len(self.values))
+        if lo >= hi:
+            raise ValueError("Empty range.")
+        if self.scan:
+            return self.values.index(self.op(self.values[lo:hi]), lo, hi)
+        k = (hi - lo).bit_length() - 1
+        left, right = int(self.levels[k][lo]), int(self.levels[k][hi - (1 << k)])
+        a, b = self.array[left], self.array[right]
+        # Both halves overlap, so on a tie the left position is the first one
+        return right if (b > a if self.pick_max else b < a) else left
+
+    def query(self, lo: Optional[int], hi: Optional[int]) -> float:
+        """Extreme of values[lo:hi]"""
+        return float(self.values[self.index(lo, hi)])
+
+
+class IndicatorContext:
+    """
+    Indicator series of one symbol's bars, computed on first use and memoised per
+    (indicator, arguments), so all B / S conditions of a request share them.
+    `bars` (bar objects or a BarSeries) must not change while the context is in use.
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, bars: Union[BarSeries, Sequence[Any]]):
+        self.bars = bars
+        self._cache: Dict[Hashable, Any] = {}
+
+    def memo(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def values(self, field: str) -> List[float]:
+        """One bar field as floats ('tr' is the true range series, one shorter than the bars)"""
+        if field == 'tr':
+            return self.memo('tr', lambda: true_ranges(self.values('high'), self.values('low'), self.values('close')))
+        if isinstance(self.bars, BarSeries):
+            return self.bars.values(field)
+        if field not in self.FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        return self.memo(field, lambda: [float(getattr(bar, field)) for bar in self.bars])
+
+    def sma(self, field: str, period: int) -> List[float]:
+        return self.memo(('sma', field, period), lambda: sma(self.values(field), period))
+
+    def atr(self, period: int) -> List[float]:
+        if len(self.bars) < period + 1:
+            return []
+        return self.sma('tr', period)
+
+    def bollinger(self, field: str, period: int, std_dev: float) -> List[Dict[str, float]]:
+        return self.memo(('bollinger', field, period, std_dev), lambda: bollinger_bands(self.values(field), period, std_dev))
+
+    def extremes(self, field: str, pick_max: bool) -> RangeExtremes:
+        return self.memo(('extremes', field, pick_max), lambda: RangeExtremes(self.values(field), pick_max))
+
+    def argmax(self, field: str, lo: Optional[int], hi: Optional[int]) -> int:
+        """Index of the (first) max of `field` over bars[lo:hi]"""
+        return self.extremes(field, True).index(lo, hi)
+
+    def argmin(self, field: str, lo: Optional[int], hi: Optional[int]) -> int:
+        """Index of the (first) min of `field` over bars[lo:hi]"""
+        return self.extremes(field, False).index(lo, hi)
+
+    def range_max(self, field: str, lo: Optional[int], hi: Optional[int]) -> float:
+        return self.extremes(field, True).query(lo, hi)
+
+    def range_min(self, field: str, lo: Optional[int], hi: Optional[int]) -> float:
+        return self.extremes(field, False).query(lo, hi)
+
+    def highest(self, field: str, bars: int) -> float:
+        """Max of `field` over the last `bars` bars"""
+        return self.range_max(field, -bars, None)
+
+    def lowest(self, field: str, bars: int) -> float:
+        """Min of `field` over the last `bars` bars"""
+        return self.range_min(field, -bars, None)
@@ -63,7 +63,9 @@ async def main(code, trade_date):
                                 entry_price = data.get('entry_price')
                                 exit1 = data.get('exit1')
 
-                                sellSignals = runAllSellConditions(code_data, spy_data, entry_date, entry_price, exit1, trade_date)
+                                # S9 reuses the 16-day energy window computed above
+                                sellSignals = runAllSellConditions(code_data, spy_data, entry_date, entry_price, exit1, trade_date,
+                                                                   energy_level=energy_data)
                                 print(sellSignals)
                                 sell = isSell(sellSignals)
                                 # print(sell)
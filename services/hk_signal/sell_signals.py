@@ -1,19 +1,14 @@
-from datetime import datetime
+from bisect import bisect_left
 from services.hk_signal.get_code_energy import calculate_energy_indicators
+from services.hk_signal.bar_series import BarSeries, is_finite, num, timestamp_ms
+from services.hk_signal.indicators import IndicatorContext
 
 
-def is_finite(value):
-    """Check if value is finite (not NaN, not inf, not -inf)"""
-    return value == value and value != float('inf') and value != float('-inf')
-
-
-def sma(values, period):
-    if len(values) < period:
-        return []
-    result = []
-    for i in range(period - 1, len(values)):
-        result.append(sum(values[i - period + 1:i + 1]) / period)
-    return result
+def sell_context(ohlcv):
+    """Indicator context over the bars (a BarSeries, or bar objects sorted and parsed here)"""
+    if isinstance(ohlcv, IndicatorContext):
+        return ohlcv
+    return IndicatorContext(ohlcv if isinstance(ohlcv, BarSeries) else BarSeries.from_bars(ohlcv))
 
 
 def exit_by_stop_loss(ohlcv, stop_loss):
@@ -30,29 +25,18 @@ def exit_by_stop_loss(ohlcv, stop_loss):
     return close <= stop_loss
 
 
-def s4(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s4(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     
     if len(data) < 200:
         raise ValueError("Insufficient history: need at least ~200 days for 150D SMA and validation window.")
     
-    closes = [num(d.close, 'close') for d in data]
-    sma_vals = sma(closes, 150)
+    closes = data.close
+    sma_vals = ctx.sma('close', 150)
     sma150 = [None] * 149 + sma_vals
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     day50_idx = buy_idx + 50
     if day50_idx >= len(data):
@@ -76,50 +60,20 @@ def s4(ohlcv, buy_date, buy_price):
     return cond_weak and cond_low_gain
 
 
-def calc_atr20(ohlcv):
-    if len(ohlcv) < 21:
-        raise ValueError("Insufficient data for ATR(20).")
-    
-    trs = []
-    for i in range(1, len(ohlcv)):
-        high = float(ohlcv[i].high)
-        low = float(ohlcv[i].low)
-        prev_close = float(ohlcv[i-1].close)
-        tr = max(
-            high - low,
-            abs(high - prev_close),
-            abs(low - prev_close)
-        )
-        trs.append(tr)
-    
-    atr_vals = sma(trs, 20)
-    return atr_vals[-1]
-
-
-def s5(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s5(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     last_idx = len(data) - 1
-    last_bar = data[last_idx]
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     days_since_buy = last_idx - buy_idx
     if days_since_buy < 45:
         return False
     
-    atr20 = calc_atr20(data)
+    if len(data) < 21:
+        raise ValueError("Insufficient data for ATR(20).")
+    atr20 = ctx.atr(20)[-1]
     if not is_finite(atr20):
         raise ValueError("Failed to calculate ATR(20).")
     
@@ -127,33 +81,18 @@ def s5(ohlcv, buy_date, buy_price):
     steps = (days_since_buy - 45) // 25
     current_stop = initial_stop + steps * 0.62 * atr20
     
-    last_close = float(last_bar.close)
-    if not is_finite(last_close):
-        raise ValueError("Invalid Close value for the last day.")
-    
+    last_close = data.close[last_idx]
     return last_close <= current_stop
 
 
-def s6(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s6(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     if len(data) < 100:
         raise ValueError("Insufficient history: need at least ~100 days to evaluate 90D high.")
     
     last_idx = len(data) - 1
-    bts = to_ts(buy_date)
-    
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     days_since_buy = last_idx - buy_idx
     if days_since_buy < 50:
@@ -165,14 +104,11 @@ def s6(ohlcv, buy_date, buy_price):
     if start > end:
         raise ValueError("Insufficient history to check 90-day highs in the given window.")
     
-    highs = [num(d.high, 'high') for d in data]
+    highs = data.high
     had_new_90d_high = False
     
     for t in range(start, end + 1):
-        prev_max = -float('inf')
-        for k in range(t - 90, t):
-            if highs[k] > prev_max:
-                prev_max = highs[k]
+        prev_max = ctx.range_max('high', t - 90, t)
         if highs[t] > prev_max:
             had_new_90d_high = True
             break
@@ -180,31 +116,14 @@ def s6(ohlcv, buy_date, buy_price):
     return not had_new_90d_high
 
 
-def calc_atr22_series(ohlcv):
-    n = len(ohlcv)
-    trs = []
-    for i in range(1, n):
-        high = num(ohlcv[i].high, 'high')
-        low = num(ohlcv[i].low, 'low')
-        prev_close = num(ohlcv[i-1].close, 'prevClose')
-        tr = max(
-            high - low,
-            abs(high - prev_close),
-            abs(low - prev_close)
-        )
-        trs.append(tr)
-    
-    atr_vals = sma(trs, 22)
-    return atr_vals
-
-
-def s7(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s7(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     if n < 23:
         raise ValueError("Insufficient data: need at least 23 daily bars for S7.")
     
-    atr22_series = calc_atr22_series(data)
+    atr22_series = ctx.atr(22)
     if len(atr22_series) < 2:
         raise ValueError("Insufficient history to calculate ATR(22) for the last two days.")
     
@@ -214,10 +133,10 @@ def s7(ohlcv, buy_date, buy_price):
     atr_prev = atr22_series[-2]
     atr_last = atr22_series[-1]
     
-    open_prev = num(data[prev_idx].open, 'open(prev)')
-    close_prev = num(data[prev_idx].close, 'close(prev)')
-    open_last = num(data[last_idx].open, 'open(last)')
-    close_last = num(data[last_idx].close, 'close(last)')
+    open_prev = num(data.open[prev_idx], 'open(prev)')
+    close_prev = data.close[prev_idx]
+    open_last = num(data.open[last_idx], 'open(last)')
+    close_last = data.close[last_idx]
     
     body_prev = open_prev - close_prev
     body_last = open_last - close_last
@@ -228,31 +147,16 @@ def s7(ohlcv, buy_date, buy_price):
     return cond_prev and cond_last
 
 
-def calc_tr_series(data):
-    trs = []
-    for i in range(1, len(data)):
-        high = num(data[i].high, 'high')
-        low = num(data[i].low, 'low')
-        prev_close = num(data[i-1].close, 'prevClose')
-        tr = max(
-            high - low,
-            abs(high - prev_close),
-            abs(low - prev_close)
-        )
-        trs.append(tr)
-    return trs
-
-
-def s8(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s8(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 148:
         raise ValueError("Insufficient history: need at least 148 days for S8.")
     
-    trs = calc_tr_series(data)
-    atr22 = sma(trs, 22)
-    atr100 = sma(trs, 100)
+    atr22 = ctx.atr(22)
+    atr100 = ctx.atr(100)
     
     if len(atr22) < 126:
         raise ValueError("Too few ATR(22) values for 126-day window.")
@@ -267,28 +171,29 @@ def s8(ohlcv, buy_date, buy_price):
     last5_atr100 = atr100[-5:]
     count_bear_huge = 0
     for j in range(5):
-        bar = data[n - 5 + j]
-        body = num(bar.open, 'open') - num(bar.close, 'close')
+        body = num(data.open[n - 5 + j], 'open') - data.close[n - 5 + j]
         thr = 2.4 * num(last5_atr100[j], 'ATR100')
         if body > thr:
             count_bear_huge += 1
     
     return count_bear_huge >= 3
 
-def s9(trade_date, ohlcv, spy_data):
-    energy_level = calculate_energy_indicators(trade_date, ohlcv, spy_data)
+def s9(trade_date, ohlcv, spy_data, energy_level=None):
+    # `energy_level` is the calculate_energy_indicators result when the caller already has it
+    if energy_level is None:
+        energy_level = calculate_energy_indicators(trade_date, ohlcv, spy_data)
     return energy_level["energy_score"] < 0.22
 
-def s10(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s10(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 101:
         raise ValueError("Insufficient history: need at least 101 days for ATR(100) and 90D High.")
     
-    trs = calc_tr_series(data)
-    atr10_series = sma(trs, 10)
-    atr100_series = sma(trs, 100)
+    atr10_series = ctx.atr(10)
+    atr100_series = ctx.atr(100)
     
     if len(atr10_series) < 1 or len(atr100_series) < 1:
         raise ValueError("Failed to calculate ATR(10) or ATR(100) - insufficient data.")
@@ -296,12 +201,11 @@ def s10(ohlcv, buy_date, buy_price):
     atr10 = num(atr10_series[-1], 'ATR(10)')
     atr100 = num(atr100_series[-1], 'ATR(100)')
     
-    last90 = data[-90:]
-    high90 = max(num(d.high, 'high') for d in last90)
+    high90 = ctx.highest('high', 90)
     if not is_finite(high90) or high90 <= 0:
         raise ValueError("Invalid 90D High value.")
     
-    last_close = num(data[n-1].close, 'close')
+    last_close = data.close[n-1]
     drawdown_pct = ((high90 - last_close) / high90) * 100
     
     cond_vol = atr10 > 2.6 * atr100
@@ -310,26 +214,15 @@ def s10(ohlcv, buy_date, buy_price):
     return cond_vol and cond_dd
 
 
-def s11(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s11(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 250:
         raise ValueError("Insufficient history: need at least 250 days to build Fibo Top/Bottom.")
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     last_idx = n - 1
     days_since_buy = last_idx - buy_idx
@@ -337,45 +230,26 @@ def s11(ohlcv, buy_date, buy_price):
     if days_since_buy < 300:
         return False
     
-    window250 = data[-250:]
-    top = max(num(d.high, 'high') for d in window250)
-    bottom = min(num(d.low, 'low') for d in window250)
+    top = ctx.highest('high', 250)
+    bottom = ctx.lowest('low', 250)
     if not is_finite(top) or not is_finite(bottom) or top <= bottom:
         raise ValueError("Invalid 250D High/Low range for Fibo.")
     
     level0382 = bottom + 0.382 * (top - bottom)
     
-    streak_below = 0
-    for i in range(last_idx, -1, -1):
-        c = num(data[i].close, 'close')
-        if c < level0382:
-            streak_below += 1
-        else:
-            break
-    
-    return streak_below >= 3
+    # The last 3 closes are all below the level iff their max is
+    return ctx.range_max('close', last_idx - 2, last_idx + 1) < level0382
 
 
-def s12(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s12(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 250:
         raise ValueError("Insufficient history: need at least 250 days for Fibo Top/Bottom.")
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     last_idx = n - 1
     days_since_buy = last_idx - buy_idx
@@ -383,44 +257,25 @@ def s12(ohlcv, buy_date, buy_price):
     if days_since_buy < 240:
         return False
     
-    window250 = data[-250:]
-    top = max(num(d.high, 'high') for d in window250)
-    bottom = min(num(d.low, 'low') for d in window250)
+    top = ctx.highest('high', 250)
+    bottom = ctx.lowest('low', 250)
     if not is_finite(top) or not is_finite(bottom) or top <= bottom:
         raise ValueError("Invalid 250D High/Low range.")
     
     level0236 = bottom + 0.236 * (top - bottom)
     
-    streak_below = 0
-    for i in range(last_idx, -1, -1):
-        c = num(data[i].close, 'close')
-        if c < level0236:
-            streak_below += 1
-        else:
-            break
-    
-    return streak_below >= 23
+    # The last 23 closes are all below the level iff their max is
+    return ctx.range_max('close', last_idx - 22, last_idx + 1) < level0236
 
 
-def s13(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s13(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     if n < 81:
         raise ValueError("Insufficient history: need at least 81 days.")
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     last_idx = n - 1
     days_since_buy = last_idx - buy_idx
@@ -428,23 +283,23 @@ def s13(ohlcv, buy_date, buy_price):
     if days_since_buy < 238:
         return False
     
-    prev80 = data[last_idx - 80:last_idx]
-    min_close80 = min(num(d.close, 'close') for d in prev80)
+    min_close80 = ctx.range_min('close', last_idx - 80, last_idx)
     
-    last_close = num(data[last_idx].close, 'close')
+    last_close = data.close[last_idx]
     
     return last_close < min_close80
 
 
 def s14(ohlcv, hsi_ohlcv, buy_date, buy_price):
-    asset = sorted(ohlcv, key=lambda x: to_ts(x.date))
-    hsi = sorted(hsi_ohlcv, key=lambda x: to_ts(x.date))
+    asset = sell_context(ohlcv).bars
+    # Only the HSI closes are read, so the other HSI fields are not validated
+    hsi = sorted(hsi_ohlcv, key=lambda x: timestamp_ms(x.date))
     
     if len(asset) < 106 or len(hsi) < 106:
         raise ValueError("Insufficient history: need at least 106 days.")
     
-    map_asset = {to_ts(b.date): num(b.close, 'asset.close') for b in asset}
-    map_hsi = {to_ts(b.date): num(b.close, 'hsi.close') for b in hsi}
+    map_asset = dict(zip(asset.stamps, asset.close))
+    map_hsi = {timestamp_ms(b.date): num(b.close, 'hsi.close') for b in hsi}
     
     common_ts = sorted([ts for ts in map_asset.keys() if ts in map_hsi])
     if len(common_ts) < 106:
@@ -455,18 +310,8 @@ def s14(ohlcv, hsi_ohlcv, buy_date, buy_price):
     
     last_idx = len(common_ts) - 1
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, ts in enumerate(common_ts):
-        if ts == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, ts in enumerate(common_ts):
-            if ts > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
+    buy_idx = bisect_left(common_ts, timestamp_ms(buy_date))
+    if buy_idx > last_idx:
         raise ValueError("Buy date is outside common dates range.")
     
     days_since_buy = last_idx - buy_idx
@@ -489,16 +334,17 @@ def s14(ohlcv, hsi_ohlcv, buy_date, buy_price):
     return under_all
 
 
-def s15(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s15(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 5:
         raise ValueError("Insufficient history: need at least 5 trading days for S15.")
     
     last_idx = n - 1
-    last_close = num(data[last_idx].close, 'close[last]')
-    base_close = num(data[last_idx - 4].close, 'close[t-4]')
+    last_close = data.close[last_idx]
+    base_close = data.close[last_idx - 4]
     if base_close <= 0:
         raise ValueError("Invalid base close[t-4] value.")
     
@@ -506,21 +352,21 @@ def s15(ohlcv, buy_date, buy_price):
     return ret4d < -0.25
 
 
-def s16(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s16(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 35:
         raise ValueError("Insufficient history: need at least 35 trading days for S16.")
     
     last_idx = n - 1
-    last_close = num(data[last_idx].close, 'close[last]')
-    base10_close = num(data[last_idx - 10].close, 'close[t-10]')
+    last_close = data.close[last_idx]
+    base10_close = data.close[last_idx - 10]
     if base10_close <= 0:
         raise ValueError("Invalid base close[t-10] value.")
     
-    trs = calc_tr_series(data)
-    atr22 = sma(trs, 22)
+    atr22 = ctx.atr(22)
     if len(atr22) < 13:
         raise ValueError("Too few ATR(22) values for comparison with t-12.")
     
@@ -535,26 +381,15 @@ def s16(ohlcv, buy_date, buy_price):
     return vol_spike and big_drop
 
 
-def s17(ohlcv, buy_date, buy_price):
-    data = sorted(ohlcv, key=lambda x: to_ts(x.date))
+def s17(ohlcv, buy_date, buy_price, ctx=None):
+    ctx = ctx or sell_context(ohlcv)
+    data = ctx.bars
     n = len(data)
     
     if n < 150:
         raise ValueError("Insufficient history: need at least 150 days for S17.")
     
-    bts = to_ts(buy_date)
-    buy_idx = -1
-    for i, d in enumerate(data):
-        if to_ts(d.date) == bts:
-            buy_idx = i
-            break
-    if buy_idx == -1:
-        for i, d in enumerate(data):
-            if to_ts(d.date) > bts:
-                buy_idx = i
-                break
-    if buy_idx == -1:
-        raise ValueError("Buy date is outside data range.")
+    buy_idx = data.index_of(buy_date)
     
     last_idx = n - 1
     days_since_buy = last_idx - buy_idx
@@ -562,9 +397,8 @@ def s17(ohlcv, buy_date, buy_price):
     if days_since_buy < 150:
         return False
     
-    window150 = data[-150:]
-    high150 = max(num(d.high, 'high') for d in window150)
-    low150 = min(num(d.low, 'low') for d in window150)
+    high150 = ctx.highest('high', 150)
+    low150 = ctx.lowest('low', 150)
     if not is_finite(high150) or not is_finite(low150) or high150 <= low150:
         raise ValueError("Invalid 150-day High/Low range.")
     
@@ -573,29 +407,34 @@ def s17(ohlcv, buy_date, buy_price):
     if not wide_range:
         return False
     
-    last_close = num(data[last_idx].close, 'close')
+    last_close = data.close[last_idx]
     near_bottom = last_close < 1.3 * low150
     
     return near_bottom
 
 
-def runAllSellConditions(ohlcv, spy_data, buy_date, buy_price, stop_loss, trade_date):
+def runAllSellConditions(ohlcv, spy_data, buy_date, buy_price, stop_loss, trade_date, ctx=None, energy_level=None):
+    # S1 reads the raw last bar and runs first, as before
+    s1 = exit_by_stop_loss(ohlcv, stop_loss)
+    # Parsed and sorted once; ATR(22), ATR(100) and 250-bar extremes are shared by the conditions
+    ctx = ctx or sell_context(ohlcv)
+    series = ctx.bars
     return {
-        'S1': exit_by_stop_loss(ohlcv, stop_loss),
-        'S4': s4(ohlcv, buy_date, buy_price),
-        'S5': s5(ohlcv, buy_date, buy_price),
-        'S6': s6(ohlcv, buy_date, buy_price),
-        'S7': s7(ohlcv, buy_date, buy_price),
-        'S8': s8(ohlcv, buy_date, buy_price),
-        'S9': s9(trade_date, ohlcv, spy_data),
-        'S10': s10(ohlcv, buy_date, buy_price),
-        'S11': s11(ohlcv, buy_date, buy_price),
-        'S12': s12(ohlcv, buy_date, buy_price),
-        'S13': s13(ohlcv, buy_date, buy_price),
-        'S14': s14(ohlcv, spy_data, buy_date, buy_price),
-        'S15': s15(ohlcv, buy_date, buy_price),
-        'S16': s16(ohlcv, buy_date, buy_price),
-        'S17': s17(ohlcv, buy_date, buy_price),
+        'S1': s1,
+        'S4': s4(series, buy_date, buy_price, ctx),
+        'S5': s5(series, buy_date, buy_price, ctx),
+        'S6': s6(series, buy_date, buy_price, ctx),
+        'S7': s7(series, buy_date, buy_price, ctx),
+        'S8': s8(series, buy_date, buy_price, ctx),
+        'S9': s9(trade_date, ohlcv, spy_data, energy_level),
+        'S10': s10(series, buy_date, buy_price, ctx),
+        'S11': s11(series, buy_date, buy_price, ctx),
+        'S12': s12(series, buy_date, buy_price, ctx),
+        'S13': s13(series, buy_date, buy_price, ctx),
+        'S14': s14(series, spy_data, buy_date, buy_price),
+        'S15': s15(series, buy_date, buy_price, ctx),
+        'S16': s16(series, buy_date, buy_price, ctx),
+        'S17': s17(series, buy_date, buy_price, ctx),
     }
 
 
@@ -605,28 +444,3 @@ def isSell(signals):
              signals['S10'] or signals['S11'] or signals['S12'] or 
              signals['S13'] or signals['S14'] or signals['S15'] or 
              signals['S16'] or signals['S17']))
-
-
-def to_ts(date):
-    if isinstance(date, datetime):
-        return date.timestamp() * 1000
-    if isinstance(date, (int, float)):
-        return date
-    try:
-        if isinstance(date, str):
-            dt = datetime.fromisoformat(date.replace('Z', '+00:00'))
-        else:
-            dt = datetime.fromisoformat(str(date))
-        return dt.timestamp() * 1000
-    except (ValueError, TypeError):
-        raise ValueError(f"Invalid date: {date}")
-
-
-def num(value, name):
-    try:
-        n = float(value)
-        if not is_finite(n):
-            raise ValueError(f"Field {name} must be a number.")
-        return n
-    except (ValueError, TypeError):
-        raise ValueError(f"Field {name} must be a number.")
\ No newline at end of file
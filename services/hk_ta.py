@@ -1,11 +1,15 @@
 import asyncio
 from controllers.hk_energy.hk_energy import call_get_symbol_adjusted_data
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from config.logger import setup_logger
 from config.settings import settings
-from services.db_service import Database_Service
+from services.db_service import Async_Database_Service
+from services.benchmark import AlignedBenchmark, date_key, get_aligned_benchmark, records_fingerprint
+from services.price_loader import PriceWindow
+from services.price_store import price_store
 
 
 algo_logger = setup_logger("ta_algo")
@@ -19,14 +23,40 @@ db_params = {
     "port": settings.serhio_db_port,
 }
 
-db_service = Database_Service(db_params, pool_size=10)
+db_service = Async_Database_Service(db_params, pool_size=10)
 
-class HK_TA_Algo:
-    def __init__(self):
-        self.is_running = False
+# Tail evaluation: bars read for the 20/50/250-day highs/lows
+HIGH_LOW_WINDOW = 250
+# Extra bars of Wilder smoothing before RSI14 is read; (13/14)^400 < 1e-12,
+# so the rounded value matches the full-history RSI as long as the price moves
+# both ways inside the warm-up (otherwise the full history is read, see _tail_rsi)
+RSI_WARMUP_BARS = 400
+# Bars the tail evaluation reads: RSI14 plus warm-up, which also covers the
+# 250 bars of highs/lows and the 251 common dates of PR250
+TA_LOOKBACK_BARS = 14 + RSI_WARMUP_BARS
+
+# Row positions used by the TA: high, low, close
+TA_COLUMNS = (6, 9, 12)
+
+
+def ta_price_window(trade_day: str) -> PriceWindow:
+    """History the tail evaluation reads for a stock on `trade_day`"""
+    return PriceWindow(end_date=trade_day, bars=TA_LOOKBACK_BARS, columns=TA_COLUMNS)
 
 
-    async def start(self, stockname: str, tradeDay: str, data_2800: Optional[List[Dict]] = None) -> Dict[str, Any]:
+def ta_benchmark_window(trade_day: str) -> PriceWindow:
+    """
+    2800 history for PR on `trade_day`: every bar up to it, as the API path reads.
+    Not cut to TA_LOOKBACK_BARS, so a stock whose window reaches further back than
+    2800's last bars (gaps, suspensions) still finds its 126 / 251 common dates.
+    """
+    return PriceWindow(end_date=trade_day, columns=TA_COLUMNS)
+
+
+class HK_TA_Algo:
+
+    async def start(self, stockname: str, tradeDay: str, data_2800: Optional[List[Dict]] = None, full_history: bool = False,
+                    rows: Optional[List[Tuple]] = None) -> Dict[str, Any]:
         try:
             logger.info(f"Start algo for: {stockname} at day: {tradeDay}")
             
@@ -40,121 +70,46 @@ class HK_TA_Algo:
                     "message": f"Trade day ({tradeDay}) is in the future (today - {today}).",
                 }
 
-            if self.is_running:
-                return {
-                    "status": "error",
-                    "message": "Algo is already running",
-                    "stockname": stockname,
-                    "tradeDay": tradeDay
-                }
-            
-            self.is_running = True
+            # No single-run guard: the algorithm is stateless and concurrent
+            # requests overlap on the async database pool
 
-            query = f"""
-            CALL get_symbol_adjusted_data('{stockname}');
-            """
-            
-            # Add retry mechanism for database queries
-            max_retries = 3
-            rows = None
-            
-            for attempt in range(max_retries):
-                try:
-                    db_service.close_all_connections() 
-                    rows = await db_service.execute_query(query)
-                    
-                    if rows:
-                        logger.info(f"Query successful for {stockname} at day {tradeDay}: {len(rows)} rows returned")
-                        break
-                    else:
-                        logger.warning(f"Query returned empty result for {stockname} (attempt {attempt + 1})")
-                        
-                except Exception as e:
-                    logger.error(f"Database query failed for {stockname} (attempt {attempt + 1}): {str(e)}")
-                    if attempt == max_retries - 1:
-                        raise
-                
-                # Short delay before retry
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(1)
+            # Rows may be preloaded by the bulk loader (services/price_loader)
+            # or served by the local price store
+            if rows is None and not full_history:
+                rows = price_store.lookup(stockname, ta_price_window(tradeDay))
+            if rows is None:
+                rows = await self._query_rows(stockname, tradeDay)
             
             if not rows:
-                logger.error(f"No data found for {stockname} after {max_retries} attempts")
+                logger.error(f"No data found for {stockname}")
                 return {
                     "status": "error",
                     "message": f"There is no data for {stockname} in database",
                     "stockname": stockname,
                     "tradeDay": tradeDay
                 }
-            if not any(row[2].strftime('%Y-%m-%d') == tradeDay for row in rows):
+            # Both paths evaluate `tradeDay`, not the newest stored bar
+            rows = (PriceWindow(end_date=tradeDay) if full_history else ta_price_window(tradeDay)).apply(rows)
+            if not any(date_key(row[2]) == tradeDay for row in reversed(rows)):
                 return {
                     "status": "error",
                     "message": f"There is no data for {stockname} at day: {tradeDay} in database.",
                     "stockname": stockname,
                     "tradeDay": tradeDay
                     }
-            data_for_df = []
-            for row in rows:
-                data_for_df.append({
-                    "high": float(row[6]),
-                    "low": float(row[9]), 
-                    "close": float(row[12]),
-                    "date": row[2]
-                })
-
-            if not data_for_df:
-                    result = {
-                        "status": "error",
-                        "message": f"There is no data for {stockname}",
-                        "stockname": stockname,
-                        "data": {}
-                    }
+            if full_history:
+                indicators = await self._full_history_indicators(rows, tradeDay, data_2800)
             else:
-                    # 20D/50D/250D High Low
-                    df = pd.DataFrame(data_for_df)
-                    df['date'] = pd.to_datetime(df['date'])
-                    df = df.sort_values('date')
-                    df['high_20d'] = df['high'].rolling(window=20, min_periods=1).max()
-                    df['low_20d'] = df['low'].rolling(window=20, min_periods=1).min()
-                    df['high_50d'] = df['high'].rolling(window=50, min_periods=1).max()
-                    df['low_50d'] = df['low'].rolling(window=50, min_periods=1).min()
-                    df['high_250d'] = df['high'].rolling(window=250, min_periods=1).max()
-
-                    # Price relative to 2800/HSI screening options, 1W/1M/3M/6M/1Y
-                    pr_2800 = await calculate_pr(df, tradeDay, data_2800)
-
-                    # RSI 14D
-                    df['low_250d'] = df['low'].rolling(window=250, min_periods=1).min()
-                    df["RSI_14"] = rsi_multicharts(df["close"], 14)
-
-                    indicators = {
-                        'high20': float(df['high_20d'].iloc[-1]) if len(df) > 0 else None,
-                        'low20': float(df['low_20d'].iloc[-1]) if len(df) > 0 else None,
-                        'high50': float(df['high_50d'].iloc[-1]) if len(df) > 0 else None,
-                        'low50': float(df['low_50d'].iloc[-1]) if len(df) > 0 else None,
-                        'high250': float(df['high_250d'].iloc[-1]) if len(df) > 0 else None,
-                        'low250': float(df['low_250d'].iloc[-1]) if len(df) > 0 else None, 
-                        "pr5": pr_2800["PR_5d"],
-                        "pr20": pr_2800["PR_20d"],
-                        "pr60": pr_2800["PR_60d"],
-                        "pr125": pr_2800["PR_125d"],
-                        "pr250": pr_2800['PR_250d'],
-                        'rsi14': round(float(df['RSI_14'].iloc[-1]), 3) if len(df) > 0 and not pd.isna(df['RSI_14'].iloc[-1]) else None,
-                        'used_days_for_calculation': len(df),
-                        'date_range': {
-                            'from': df['date'].min().strftime('%Y-%m-%d') if len(df) > 0 else None,
-                            'to': df['date'].max().strftime('%Y-%m-%d') if len(df) > 0 else None
-                        }
-                    }
-                    
-                    result = {
-                        "status": "success",
-                        "tradeDay": tradeDay,
-                        "message": f"Algorithm successfully completed for {stockname}",
-                        "stockname": stockname,
-                        "data_from_sergio_ta": indicators,
-                        
-                    }
+                indicators = await self._tail_indicators(stockname, rows, tradeDay, data_2800)
+
+            result = {
+                "status": "success",
+                "tradeDay": tradeDay,
+                "message": f"Algorithm successfully completed for {stockname}",
+                "stockname": stockname,
+                "data_from_sergio_ta": indicators,
+                
+            }
             
             logger.info(f"Algorithm successfully completed for {stockname}")
             return result
@@ -166,29 +121,214 @@ class HK_TA_Algo:
                 "message": f"Algorithm errors: {str(e)}",
                 "stockname": stockname
             }
-        finally:
-            self.is_running = False
+
+    async def _query_rows(self, stockname: str, tradeDay: str) -> Optional[List[Tuple]]:
+        query = f"""
+        CALL get_symbol_adjusted_data('{stockname}');
+        """
+    
+        # Add retry mechanism for database queries
+        max_retries = 3
+        rows = None
+    
+        for attempt in range(max_retries):
+            try:
+                rows = await db_service.execute_query(query)
+            
+                if rows:
+                    logger.info(f"Query successful for {stockname} at day {tradeDay}: {len(rows)} rows returned")
+                    break
+                else:
+                    logger.warning(f"Query returned empty result for {stockname} (attempt {attempt + 1})")
+                
+            except Exception as e:
+                logger.error(f"Database query failed for {stockname} (attempt {attempt + 1}): {str(e)}")
+                if attempt == max_retries - 1:
+                    raise
+        
+            # Short delay before retry
+            if attempt < max_retries - 1:
+                await asyncio.sleep(1)
+        return rows
+
+    async def _full_history_indicators(self, rows: List[Tuple], tradeDay: str, data_2800: Optional[List[Dict]]) -> Dict[str, Any]:
+        """
+        Reference path: rolling columns over the whole history up to `tradeDay`, only
+        the last row is read. Kept to verify the tail evaluation.
+        """
+        data_for_df = []
+        for row in rows:
+            data_for_df.append({
+                "high": float(row[6]),
+                "low": float(row[9]), 
+                "close": float(row[12]),
+                "date": row[2]
+            })
+
+        # 20D/50D/250D High Low
+        df = pd.DataFrame(data_for_df)
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.sort_values('date')
+        df['high_20d'] = df['high'].rolling(window=20, min_periods=1).max()
+        df['low_20d'] = df['low'].rolling(window=20, min_periods=1).min()
+        df['high_50d'] = df['high'].rolling(window=50, min_periods=1).max()
+        df['low_50d'] = df['low'].rolling(window=50, min_periods=1).min()
+        df['high_250d'] = df['high'].rolling(window=250, min_periods=1).max()
+
+        # Price relative to 2800/HSI screening options, 1W/1M/3M/6M/1Y
+        pr_2800 = await calculate_pr(df, tradeDay, data_2800)
+
+        # RSI 14D
+        df['low_250d'] = df['low'].rolling(window=250, min_periods=1).min()
+        rsi_14 = rsi_multicharts_last(df["close"], 14)
+
+        return {
+            'high20': float(df['high_20d'].iloc[-1]) if len(df) > 0 else None,
+            'low20': float(df['low_20d'].iloc[-1]) if len(df) > 0 else None,
+            'high50': float(df['high_50d'].iloc[-1]) if len(df) > 0 else None,
+            'low50': float(df['low_50d'].iloc[-1]) if len(df) > 0 else None,
+            'high250': float(df['high_250d'].iloc[-1]) if len(df) > 0 else None,
+            'low250': float(df['low_250d'].iloc[-1]) if len(df) > 0 else None, 
+            "pr5": pr_2800["PR_5d"],
+            "pr20": pr_2800["PR_20d"],
+            "pr60": pr_2800["PR_60d"],
+            "pr125": pr_2800["PR_125d"],
+            "pr250": pr_2800['PR_250d'],
+            'rsi14': round(rsi_14, 3) if len(df) > 0 and not pd.isna(rsi_14) else None,
+            'used_days_for_calculation': len(df),
+            'date_range': {
+                'from': df['date'].min().strftime('%Y-%m-%d') if len(df) > 0 else None,
+                'to': df['date'].max().strftime('%Y-%m-%d') if len(df) > 0 else None
+            }
+        }
+
+    async def _tail_indicators(self, stockname: str, rows: List[Tuple], tradeDay: str, data_2800: Optional[List[Dict]]) -> Dict[str, Any]:
+        """
+        Tail evaluation: only the last 250 bars for highs/lows, the last 251 common
+        dates for PR and RSI14 with RSI_WARMUP_BARS of Wilder warm-up.
+        used_days_for_calculation / date_range.from describe the symbol's whole history, as in the
+        full-history path, when `rows` is a window that remembers it (price_store.HistoryRows).
+        """
+        history_days = getattr(rows, "history_days", len(rows))
+        first_date = getattr(rows, "first_date", None)
+        rows = sorted(rows, key=lambda row: row[2])
+
+        # 20D/50D/250D High Low
+        window = rows[-HIGH_LOW_WINDOW:]
+        highs = [float(row[6]) for row in window]
+        lows = [float(row[9]) for row in window]
+
+        # Price relative to 2800/HSI screening options, 1W/1M/3M/6M/1Y
+        pr_2800 = await calculate_pr_for_dates([row[2] for row in rows], [row[12] for row in rows], tradeDay, data_2800)
+
+        # RSI 14D
+        rsi_14 = await self._tail_rsi(stockname, rows, history_days, tradeDay)
+
+        return {
+            'high20': max(highs[-20:]),
+            'low20': min(lows[-20:]),
+            'high50': max(highs[-50:]),
+            'low50': min(lows[-50:]),
+            'high250': max(highs),
+            'low250': min(lows),
+            "pr5": pr_2800["PR_5d"],
+            "pr20": pr_2800["PR_20d"],
+            "pr60": pr_2800["PR_60d"],
+            "pr125": pr_2800["PR_125d"],
+            "pr250": pr_2800['PR_250d'],
+            'rsi14': round(rsi_14, 3) if not pd.isna(rsi_14) else None,
+            'used_days_for_calculation': history_days,
+            'date_range': {
+                'from': date_key(first_date or rows[0][2]),
+                'to': rows[-1][2].strftime('%Y-%m-%d')
+            }
+        }
+
+    async def _tail_rsi(self, stockname: str, rows: List[Tuple], history_days: int, tradeDay: str) -> float:
+        """
+        RSI14 from the last 14 + RSI_WARMUP_BARS closes. A warm-up without gains or without
+        losses leaves only decayed averages, whose ratio depends on older bars: then the
+        closes up to `tradeDay` are read in full, as the full-history path does.
+        """
+        closes = [float(row[12]) for row in rows[-(14 + RSI_WARMUP_BARS):]]
+        if len(closes) >= history_days:
+            return rsi_multicharts_last(closes, 14)
+        deltas = np.diff(closes)
+        if (deltas > 0).any() and (deltas < 0).any():
+            return rsi_multicharts_last(closes, 14)
+
+        logger.info(f"RSI warm-up of {stockname} moves one way only, reading its full history")
+        window = PriceWindow(end_date=tradeDay, columns=TA_COLUMNS)
+        history = price_store.lookup(stockname, window) or window.apply(await self._query_rows(stockname, tradeDay))
+        if not history:
+            return rsi_multicharts_last(closes, 14)
+        return rsi_multicharts_last([float(row[12]) for row in sorted(history, key=lambda row: row[2])], 14)
     
 
 def rsi_multicharts(close: pd.Series, period: int = 14) -> pd.Series:
+    avg_gain, avg_loss = _wilder_averages(close.to_numpy(dtype="float64"), period)
+    return pd.Series(_rsi_from_averages(avg_gain, avg_loss), index=close.index, dtype="float64")
+
+
+def rsi_multicharts_last(close: Sequence[float], period: int = 14) -> float:
+    """Same as rsi_multicharts(close, period).iloc[-1] without materialising the series."""
+    gain, loss = _gains_losses(np.asarray(close, dtype="float64"), period)
+
+    avg_gain = _seed_mean(gain[:period])
+    avg_loss = _seed_mean(loss[:period])
+    for g, l in zip(gain[period:].tolist(), loss[period:].tolist()):
+        avg_gain = (avg_gain * (period - 1) + g) / period
+        avg_loss = (avg_loss * (period - 1) + l) / period
+
+    return float(_rsi_from_averages(np.array([avg_gain]), np.array([avg_loss]))[0])
+
+
+def _gains_losses(close: np.ndarray, period: int):
+    if len(close) <= period:
+        raise IndexError(f"RSI({period}) needs at least {period + 1} closes, got {len(close)}")
 
-    delta = close.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
+    # Same semantics as close.diff().clip(lower=0) / -close.diff().clip(upper=0), without the leading NaN
+    delta = np.diff(close)
+    gain = np.where(delta < 0, 0.0, delta)
+    loss = -np.where(delta > 0, 0.0, delta)
+    return gain, loss
 
-    avg_gain = pd.Series(dtype="float64", index=close.index)
-    avg_loss = pd.Series(dtype="float64", index=close.index)
 
-    avg_gain.iloc[period] = gain.iloc[1:period+1].mean()
-    avg_loss.iloc[period] = loss.iloc[1:period+1].mean()
+def _seed_mean(values: np.ndarray) -> float:
+    # pandas mean(): NaN filled with 0 before the (pairwise) sum, divided by the non-NaN count
+    mask = ~np.isnan(values)
+    count = int(mask.sum())
+    if count == 0:
+        return float("nan")
+    return float(np.where(mask, values, 0.0).sum() / count)
 
-    for i in range(period+1, len(close)):
-        avg_gain.iloc[i] = (avg_gain.iloc[i-1] * (period - 1) + gain.iloc[i]) / period
-        avg_loss.iloc[i] = (avg_loss.iloc[i-1] * (period - 1) + loss.iloc[i]) / period
 
-    # RS та RSI
-    rs = avg_gain / avg_loss
-    rsi = pd.Series(index=close.index, dtype="float64")
+def _wilder_averages(close: np.ndarray, period: int):
+    """
+    Wilder-smoothed average gain/loss aligned with `close`, NaN before `period`.
+    Recursive filter over raw float buffers instead of per-element .iloc writes.
+    """
+    gain, loss = _gains_losses(close, period)
+
+    avg_gain = np.full(len(close), np.nan)
+    avg_loss = np.full(len(close), np.nan)
+
+    g_avg = _seed_mean(gain[:period])
+    l_avg = _seed_mean(loss[:period])
+    g_out = [g_avg]
+    l_out = [l_avg]
+    for g, l in zip(gain[period:].tolist(), loss[period:].tolist()):
+        g_avg = (g_avg * (period - 1) + g) / period
+        l_avg = (l_avg * (period - 1) + l) / period
+        g_out.append(g_avg)
+        l_out.append(l_avg)
+
+    avg_gain[period:] = g_out
+    avg_loss[period:] = l_out
+    return avg_gain, avg_loss
+
+
+def _rsi_from_averages(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
     # Exceptions:
     # - avg_loss == 0 & avg_gain > 0 → RSI = 100
     # - avg_gain == 0 & avg_loss > 0 → RSI = 0
@@ -196,14 +336,20 @@ def rsi_multicharts(close: pd.Series, period: int = 14) -> pd.Series:
     mask_loss_zero = (avg_loss == 0)
     mask_gain_zero = (avg_gain == 0)
 
-    rsi[~mask_loss_zero & ~mask_gain_zero] = 100 - (100 / (1 + rs[~mask_loss_zero & ~mask_gain_zero]))
-    rsi[mask_loss_zero & ~mask_gain_zero] = 100.0
-    rsi[~mask_loss_zero & mask_gain_zero] = 0.0
-    rsi[mask_loss_zero & mask_gain_zero] = 50.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        rsi = 100 - (100 / (1 + rs))
 
+    rsi = np.where(mask_loss_zero & ~mask_gain_zero, 100.0, rsi)
+    rsi = np.where(~mask_loss_zero & mask_gain_zero, 0.0, rsi)
+    rsi = np.where(mask_loss_zero & mask_gain_zero, 50.0, rsi)
     return rsi
 
 async def calculate_pr(df_stock: pd.DataFrame, tradeDay: str, data_2800: List[Dict], periods=(5, 20, 60, 125, 250)) -> Any:
+    return await calculate_pr_for_dates(df_stock["date"].tolist(), df_stock["close"].tolist(), tradeDay, data_2800, periods)
+
+
+async def calculate_pr_for_dates(dates: List[Any], closes: List[Any], tradeDay: str, data_2800: List[Dict], periods=(5, 20, 60, 125, 250)) -> Any:
     try:
         if data_2800 is None or not data_2800:
             trade_day_date = datetime.strptime(tradeDay, '%Y-%m-%d').date()
@@ -221,41 +367,18 @@ async def calculate_pr(df_stock: pd.DataFrame, tradeDay: str, data_2800: List[Di
                         "date": trade_date
                     })
 
-        df_bench = pd.DataFrame(data_2800)
-        s = df_stock[["date", "close"]].rename(columns={"close": "close_s"})
-        b = df_bench[["date", "close"]].rename(columns={"close": "close_b"})
-
+        # 2800 is aligned once per trade day and reused by every stock
+        benchmark = get_aligned_benchmark(
+            ("pr", tradeDay) + records_fingerprint(data_2800),
+            lambda: AlignedBenchmark.from_records(data_2800)
+        )
 
-        s["date"] = pd.to_datetime(s["date"])
-        b["date"] = pd.to_datetime(b["date"])
-
-        df = pd.merge(s, b, on="date", how="inner").sort_values("date").reset_index(drop=True)
-
-        for n in periods:
-            if len(df) > n:
-                stock_ratio = df["close_s"] / df["close_s"].shift(n)
-                bench_ratio = df["close_b"] / df["close_b"].shift(n)
-                pr_values = stock_ratio / bench_ratio
-                df[f"PR_{n}d"] = pr_values
-            else:
-                logger.warning(f"Недостатньо даних для розрахунку PR_{n}d (потрібно {n+1}, маємо {len(df)})")
-                df[f"PR_{n}d"] = None
-                
-            
-        last = df.iloc[-1]
-        PR_5d   = float(last["PR_5d"])   if pd.notna(last["PR_5d"])   else None
-        PR_20d  = float(last["PR_20d"])  if pd.notna(last["PR_20d"])  else None
-        PR_60d  = float(last["PR_60d"])  if pd.notna(last["PR_60d"])  else None
-        PR_125d = float(last["PR_125d"]) if pd.notna(last["PR_125d"]) else None
-        PR_250d = float(last["PR_250d"]) if pd.notna(last["PR_250d"]) else None
-        logger.info(f"Фінальні результати PR - 5d: {PR_5d}, 20d: {PR_20d}, 60d: {PR_60d}, 125d: {PR_125d}, 250d: {PR_250d}")
+        pr_values = benchmark_pr(dates, closes, benchmark, periods)
+        logger.info(f"Фінальні результати PR - " + ", ".join(f"{n}d: {pr_values[f'PR_{n}d']}" for n in periods))
 
         return {
-            "PR_5d": round(PR_5d, 3) if PR_5d is not None else None,
-            "PR_20d": round(PR_20d, 3) if PR_20d is not None else None,
-            "PR_60d": round(PR_60d, 3) if PR_60d is not None else None,
-            "PR_125d": round(PR_125d, 3) if PR_125d is not None else None,
-            "PR_250d": round(PR_250d, 3) if PR_250d is not None else None,
+            key: round(value, 3) if value is not None else None
+            for key, value in pr_values.items()
         }
 
     
@@ -266,4 +389,42 @@ async def calculate_pr(df_stock: pd.DataFrame, tradeDay: str, data_2800: List[Di
         }
 
 
+def benchmark_pr(dates: List[Any], closes: List[Any], benchmark: AlignedBenchmark, periods=(5, 20, 60, 125, 250)) -> Dict[str, Optional[float]]:
+    """
+    PR_n = (close / close[n]) / (close_2800 / close_2800[n]) on the dates both traded.
+    Walks back from the last bar only as far as the longest period needs.
+    """
+    needed = max(periods) + 1
+
+    # Inner join on date: stock bars the benchmark also has, newest first
+    stock_closes = []
+    bench_positions = []
+    for date, close in zip(reversed(dates), reversed(closes)):
+        position = benchmark.position(date)
+        if position is None:
+            continue
+        stock_closes.append(float(close))
+        bench_positions.append(position)
+        if len(stock_closes) == needed:
+            break
+
+    if not stock_closes:
+        raise Exception("There are no common dates with 2800")
+
+    result = {}
+    for n in periods:
+        pr = None
+        if len(stock_closes) > n:
+            stock_base = stock_closes[n]
+            bench_ratio = benchmark.ratio_between(bench_positions[0], bench_positions[n])
+            if stock_base != 0 and bench_ratio != 0 and not pd.isna(bench_ratio):
+                stock_ratio = stock_closes[0] / stock_base
+                pr = stock_ratio / bench_ratio
+        else:
+            logger.warning(f"Недостатньо даних для розрахунку PR_{n}d (потрібно {n+1}, маємо {len(stock_closes)})")
+        result[f"PR_{n}d"] = float(pr) if pr is not None and not pd.isna(pr) else None
+
+    return result
+
+
 HK_TA = HK_TA_Algo()
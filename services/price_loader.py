@@ -0,0 +1,164 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from config.logger import setup_logger
+from config.settings import settings
+from services.benchmark import date_key
+from services.db_service import Async_Database_Service
+from services.price_store import HistoryRows, price_store
+
+price_logger = setup_logger("price_loader")
+logger = price_logger
+
+db_params = {
+    "db": settings.serhio_db,
+    "user": settings.serhio_db_user,
+    "password": settings.serhio_db_pass,
+    "host": settings.serhio_db_host,
+    "port": settings.serhio_db_port,
+}
+
+# Multi-statement connections: one round trip carries a CALL per symbol
+db_service = Async_Database_Service(db_params, pool_size=settings.price_batch_concurrency, multi_statements=True)
+
+SYMBOL_QUERY = "CALL get_symbol_adjusted_data(%s)"
+
+# Trade date position in get_symbol_adjusted_data rows
+DATE_COLUMN = 2
+
+
+@dataclass(frozen=True)
+class PriceWindow:
+    """
+    The part of a symbol's adjusted history a pipeline reads: bars up to `end_date`,
+    from `start_date` and/or only the last `bars` of them. With `columns` set, other
+    row positions are replaced by None, so rows keep their layout but drop unused values.
+    The result is a HistoryRows that still reports the length of the history up to
+    `end_date` and its first date.
+    """
+    end_date: Optional[str] = None
+    start_date: Optional[str] = None
+    bars: Optional[int] = None
+    columns: Optional[Tuple[int, ...]] = None
+
+    def apply(self, rows: Optional[List[Tuple]]) -> Optional[List[Tuple]]:
+        if not rows:
+            return rows
+
+        if isinstance(rows, HistoryRows):
+            history_days, first_date = rows.history_days, rows.first_date
+        else:
+            last = self.end_date or "9999-12-31"
+            history_days = sum(1 for row in rows if date_key(row[DATE_COLUMN]) <= last)
+            first_date = min(row[DATE_COLUMN] for row in rows)
+
+        if self.end_date is not None or self.start_date is not None:
+            start = self.start_date or ""
+            end = self.end_date or "9999-12-31"
+            rows = [row for row in rows if start <= date_key(row[DATE_COLUMN]) <= end]
+
+        if self.bars is not None:
+            rows = sorted(rows, key=lambda row: row[DATE_COLUMN])[-self.bars:] if self.bars > 0 else []
+
+        if self.columns is not None and rows:
+            keep = set(self.columns) | {DATE_COLUMN}
+            positions = range(len(rows[0]))
+            rows = [tuple(row[i] if i in keep else None for i in positions) for row in rows]
+
+        return HistoryRows(rows, history_days, first_date)
+
+
+async def load_symbols_adjusted_data(codes: Iterable[str],
+                                     window: Optional[PriceWindow] = None,
+                                     batch_size: int = settings.price_batch_size,
+                                     concurrency: int = settings.price_batch_concurrency) -> Dict[str, Optional[List[Tuple]]]:
+    """
+    Adjusted history (same rows as get_symbol_adjusted_data) for many symbols.
+    Symbols are sent in batches of `batch_size` CALLs per round trip; a batch that
+    fails or returns an unexpected number of result sets is re-read symbol by symbol.
+    Symbols without data map to None; `window` is applied to each symbol as its rows arrive.
+    Symbols the local price store already holds up to window.end_date are served from it.
+    """
+    result: Dict[str, Optional[List[Tuple]]] = {}
+    unique_codes = []
+    for code in dict.fromkeys(code.strip() for code in codes):
+        stored = price_store.lookup(code, window)
+        if stored is not None:
+            result[code] = stored or None
+        else:
+            unique_codes.append(code)
+
+    batches = [unique_codes[i:i + batch_size] for i in range(0, len(unique_codes), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(batch: List[str]) -> Dict[str, Optional[List[Tuple]]]:
+        async with semaphore:
+            batch_result = await _load_batch(batch)
+        if window is not None:
+            batch_result = {code: window.apply(rows) or None for code, rows in batch_result.items()}
+        return batch_result
+
+    for batch_result in await asyncio.gather(*(run(batch) for batch in batches)):
+        result.update(batch_result)
+
+    loaded = sum(1 for rows in result.values() if rows)
+    logger.info(f"Loaded adjusted data for {loaded}/{len(result)} symbols ({len(unique_codes)} from the database in {len(batches)} batches)")
+    return result
+
+
+async def refresh_price_store(codes: Iterable[str],
+                              batch_size: int = settings.price_batch_size) -> Dict[str, int]:
+    """
+    Bring the local price store up to date, `batch_size` symbols at a time.
+    get_symbol_adjusted_data has no date argument, so every symbol's full history is
+    still read from MySQL; batching only bounds memory to one batch of histories.
+    Returns how many symbols were created / appended / unchanged / rewritten / missing.
+    """
+    summary = {"created": 0, "appended": 0, "unchanged": 0, "rewritten": 0, "missing": 0}
+    unique_codes = list(dict.fromkeys(code.strip() for code in codes))
+    for start in range(0, len(unique_codes), batch_size):
+        histories = await load_symbols_adjusted_data(unique_codes[start:start + batch_size], batch_size=batch_size)
+        for code, rows in histories.items():
+            if not rows:
+                summary["missing"] += 1
+                continue
+            try:
+                summary[price_store.refresh(code, rows)] += 1
+            except Exception as e:
+                logger.error(f"Price store refresh failed for {code}: {e}")
+                summary["missing"] += 1
+    logger.info(f"Price store refreshed: {summary}")
+    return summary
+
+
+async def _load_batch(codes: List[str]) -> Dict[str, Optional[List[Tuple]]]:
+    query = ";".join([SYMBOL_QUERY] * len(codes))
+    try:
+        result_sets = await db_service.execute_multi_query(query, tuple(codes))
+    except Exception as e:
+        logger.warning(f"Bulk query failed for {len(codes)} symbols, falling back to per-symbol calls: {e}")
+        return await _load_one_by_one(codes)
+
+    if len(result_sets) != len(codes):
+        # Every CALL should yield exactly one result set; anything else cannot be mapped back safely
+        logger.warning(f"Bulk query returned {len(result_sets)} result sets for {len(codes)} symbols, falling back to per-symbol calls")
+        return await _load_one_by_one(codes)
+
+    return {code: rows or None for code, rows in zip(codes, result_sets)}
+
+
+async def _load_one_by_one(codes: List[str]) -> Dict[str, Optional[List[Tuple]]]:
+    result = {}
+    for code in codes:
+        result[code] = await load_symbol_adjusted_data(code)
+    return result
+
+
+async def load_symbol_adjusted_data(code: str) -> Optional[List[Tuple]]:
+    """Per-symbol procedure call, also the fallback of the bulk loader"""
+    try:
+        rows = await db_service.execute_query(SYMBOL_QUERY, (code.strip(),))
+    except Exception as e:
+        logger.error(f"Database query failed for {code}: {e}")
+        return None
+    return rows or None
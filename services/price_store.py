@@ -0,0 +1,170 @@
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.logger import setup_logger
+from config.settings import settings
+
+store_logger = setup_logger("price_store")
+logger = store_logger
+
+# Row positions of get_symbol_adjusted_data kept in the store:
+# open (4), TA high/low/close (6/9/12), Energy high/low/close (7/10/13), volume (16)
+STORE_COLUMNS = (4, 6, 7, 9, 10, 12, 13, 16)
+DATE_COLUMN = 2
+ROW_WIDTH = max(STORE_COLUMNS) + 1
+
+RECORD_DTYPE = np.dtype([("date", "datetime64[D]")] + [(f"c{i}", "f8") for i in STORE_COLUMNS])
+
+
+class HistoryRows(list):
+    """
+    Rows cut from a symbol's history that remember the history itself:
+    `history_days` bars up to the window's end, the first of them dated `first_date`.
+    """
+
+    def __init__(self, rows: Sequence[Tuple], history_days: int, first_date: Any):
+        super().__init__(rows)
+        self.history_days = history_days
+        self.first_date = first_date
+
+
+class PriceStore:
+    """
+    One append-only binary file of RECORD_DTYPE per symbol, read through np.memmap.
+    Reads are zero-copy until rows are materialised; a refresh appends the new bars
+    when the stored history is unchanged and rewrites the file when adjustments moved it.
+    """
+
+    def __init__(self, root: str = settings.price_store_path):
+        self.root = root
+
+    def path(self, code: str) -> str:
+        code = code.strip()
+        if not code or os.sep in code or code.startswith("."):
+            raise ValueError(f"Invalid symbol code: {code!r}")
+        return os.path.join(self.root, f"{code}.bin")
+
+    def read(self, code: str) -> Optional[np.ndarray]:
+        """Stored bars of `code` in date order (read-only memmap), None if the symbol is not stored"""
+        path = self.path(code)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        count = size // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+    def rows(self, code: str, window: Any = None) -> Optional[List[Tuple]]:
+        """
+        Stored bars as get_symbol_adjusted_data rows (positions outside STORE_COLUMNS are None).
+        `window` is a price_loader.PriceWindow; None returns every stored bar.
+        history_days counts the stored bars up to window.end_date.
+        """
+        data = self.read(code)
+        if data is None:
+            return None
+        history_days = len(data)
+        if window is not None and window.end_date is not None:
+            history_days = int(np.searchsorted(data["date"], np.datetime64(window.end_date, "D"), side="right"))
+        first_date = data["date"][0].astype(object) if len(data) else None
+        if window is not None:
+            data = select(data, window.start_date, window.end_date, window.bars)
+        columns = STORE_COLUMNS if window is None or window.columns is None else \
+            tuple(i for i in STORE_COLUMNS if i in window.columns)
+        return HistoryRows(to_rows(data, columns), history_days, first_date)
+
+    def lookup(self, code: str, window: Any) -> Optional[List[Tuple]]:
+        """
+        Rows for `window` when the store is enabled and already holds its end date,
+        None when the caller has to read the database instead.
+        """
+        if not settings.price_store_enabled or window is None or window.end_date is None:
+            return None
+        try:
+            data = self.read(code)
+        except ValueError:
+            return None
+        if data is None or len(data) == 0:
+            return None
+        end = np.datetime64(window.end_date, "D")
+        position = np.searchsorted(data["date"], end)
+        if position >= len(data) or data["date"][position] != end:
+            return None
+        return self.rows(code, window)
+
+    def refresh(self, code: str, rows: Sequence[Tuple]) -> str:
+        """
+        Bring `code` up to date with a full procedure result.
+        Returns "created", "appended", "unchanged" or "rewritten".
+        """
+        fresh = from_rows(rows)
+        stored = self.read(code)
+
+        if stored is None or len(stored) == 0:
+            self._write(code, fresh)
+            return "created"
+
+        n = len(stored)
+        if len(fresh) >= n and fresh[:n].tobytes() == stored.tobytes():
+            if len(fresh) == n:
+                return "unchanged"
+            with open(self.path(code), "ab") as f:
+                f.write(fresh[n:].tobytes())
+            return "appended"
+
+        # Adjustments changed already stored bars
+        self._write(code, fresh)
+        return "rewritten"
+
+    def _write(self, code: str, data: np.ndarray) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data.tobytes())
+            # Readers holding the old memmap keep a consistent copy
+            os.replace(tmp_path, self.path(code))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def from_rows(rows: Sequence[Tuple]) -> np.ndarray:
+    """Procedure rows -> RECORD_DTYPE array sorted by date (NULLs stored as NaN)"""
+    data = np.empty(len(rows), dtype=RECORD_DTYPE)
+    if not rows:
+        return data
+    data["date"] = np.array([str(row[DATE_COLUMN])[:10] for row in rows], dtype="datetime64[D]")
+    for i in STORE_COLUMNS:
+        data[f"c{i}"] = [float(row[i]) if row[i] is not None else np.nan for row in rows]
+    return data[np.argsort(data["date"], kind="stable")]
+
+
+def select(data: np.ndarray, start_date: Optional[str] = None, end_date: Optional[str] = None,
+           bars: Optional[int] = None) -> np.ndarray:
+    """Zero-copy slice of date-ordered bars: start_date <= date <= end_date, then the last `bars`"""
+    dates = data["date"]
+    lo = np.searchsorted(dates, np.datetime64(start_date, "D"), side="left") if start_date else 0
+    hi = np.searchsorted(dates, np.datetime64(end_date, "D"), side="right") if end_date else len(data)
+    if bars is not None:
+        lo = max(lo, hi - max(bars, 0))
+    return data[lo:hi]
+
+
+def to_rows(data: np.ndarray, columns: Sequence[int] = STORE_COLUMNS) -> List[Tuple]:
+    """Materialise bars as tuples in the get_symbol_adjusted_data layout"""
+    count = len(data)
+    values: Dict[int, List[Any]] = {DATE_COLUMN: data["date"].astype(object).tolist()}
+    for i in columns:
+        values[i] = [None if v != v else v for v in data[f"c{i}"].tolist()]
+    empty = [None] * count
+    return list(zip(*(values.get(i, empty) for i in range(ROW_WIDTH))))
+
+
+price_store = PriceStore()
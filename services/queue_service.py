@@ -1,24 +1,34 @@
-
-
-from typing import List, Dict
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Set, Union
 from celery import Celery, chord
 from celery.exceptions import Retry
+from celery.signals import worker_process_init, worker_process_shutdown
 import os
 import asyncio
-import requests
+import time
 from datetime import datetime
 
 from controllers.get_stocks_codes import get_stocks_codes
 from controllers.hk_energy.hk_energy import call_get_symbol_adjusted_data, prepare_stock_data
+from controllers.hk_energy.hk_energy import db_service as energy_db_service
 from models.schemas import EnergyStockRecord
-from services.hk_ta import HK_TA
-from services.hk_energy import HK_Energy_TA
+from services.hk_ta import HK_TA, ta_benchmark_window, ta_price_window
+from services.hk_ta import db_service as ta_db_service
+from services.hk_energy import HK_Energy_TA, energy_price_window
 from services.db_service import Database_Service
+from services.price_loader import PriceWindow, load_symbols_adjusted_data, refresh_price_store
+from services.price_loader import db_service as price_db_service
+from services.benchmark import load_payload, publish_payload
+from services.triggers import get_poll_trigger
+from services.checkpoints import completed_codes, mark_completed, pending_codes, record_failure
+from services.checkpoints import reset as reset_checkpoints
+from services.result_store import ENERGY_FIELDS, TA1_FIELDS, TA2_FIELDS, result_store
 from config.settings import settings
 from config.logger import setup_logger
-from services.file_services import FileService
+from services.file_services import FileService, ShardedCsvWriter
 
 file_service = FileService()
+# Worker outputs go to per-process shards, merged into the signal files by the chord callbacks
+shard_writer = ShardedCsvWriter()
 # Setup logger
 queue_logger = setup_logger("queue_service")
 logger = queue_logger
@@ -47,8 +57,6 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
 )
-#720
-MAX_ATTEMPTS = 720
 
 # DB agents
 db_params_seghio = {
@@ -61,43 +69,240 @@ db_params_seghio = {
 
 db_service = Database_Service(db_params_seghio, pool_size=15)
 
-BASE_URL = 'http://fastapi-app:8000'
+
+class WorkerRuntime:
+    """
+    One asyncio event loop per worker process. Tasks run their coroutines on it,
+    so async resources (aiomysql pools, sessions) survive from one task to the next.
+    Cleanup hooks run on the loop when the worker process shuts down.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._cleanups: List[Callable[[], Awaitable[Any]]] = []
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._loop.is_closed() or self._pid != os.getpid():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._pid = os.getpid()
+            logger.info(f"Worker event loop started (pid {self._pid})")
+        return self._loop
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Run a coroutine to completion on the worker loop"""
+        loop = self.loop
+        future = asyncio.ensure_future(coro, loop=loop)
+        try:
+            return loop.run_until_complete(future)
+        except BaseException:
+            # Interrupted from outside (e.g. soft time limit): do not leave the coroutine pending on the loop
+            if not future.done():
+                future.cancel()
+                try:
+                    loop.run_until_complete(future)
+                except BaseException:
+                    pass
+            raise
+
+    def on_shutdown(self, cleanup: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        self._cleanups.append(cleanup)
+        return cleanup
+
+    def shutdown(self) -> None:
+        if self._loop is None or self._loop.is_closed() or self._pid != os.getpid():
+            return
+        for cleanup in reversed(self._cleanups):
+            try:
+                self._loop.run_until_complete(cleanup())
+            except Exception as e:
+                logger.error(f"Worker cleanup failed: {e}")
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+        self._loop = None
+        logger.info(f"Worker event loop closed (pid {os.getpid()})")
+
+
+worker_runtime = WorkerRuntime()
+worker_runtime.on_shutdown(ta_db_service.close)
+worker_runtime.on_shutdown(energy_db_service.close)
+worker_runtime.on_shutdown(price_db_service.close)
+
+
+@worker_runtime.on_shutdown
+async def _close_sync_pool():
+    db_service.close_all_connections()
+
+
+@worker_process_init.connect
+def start_worker_runtime(**kwargs):
+    worker_runtime.loop
+
+
+@worker_process_shutdown.connect
+def stop_worker_runtime(**kwargs):
+    worker_runtime.shutdown()
+
+
+def _energy_records(payload: List[Dict]) -> List[EnergyStockRecord]:
+    return [EnergyStockRecord(**record_dict) for record_dict in payload]
+
+
+def _chunks(codes: List[str], size: int) -> List[List[str]]:
+    return [codes[i:i + size] for i in range(0, len(codes), size)]
+
+
+def _code_result(stock_code: str, result: Dict[str, Any], stage: Optional[str] = None) -> Dict[str, Any]:
+    """Per-code outcome reported by batch tasks to the chord callback"""
+    code_result = {"stock_code": stock_code, "status": result.get("status"), "message": result.get("message")}
+    if stage:
+        code_result["stage"] = stage
+    return code_result
+
+
+def _track(stage: str, trade_day: str, stock_code: str, started: float, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-code outcome with its duration; failures are written to the run's failure ledger"""
+    duration = time.perf_counter() - started
+    code_result = _code_result(stock_code, result, stage)
+    code_result["duration"] = round(duration, 3)
+    if result.get("status") != "success":
+        record_failure(stage, trade_day, stock_code, result.get("message"), duration)
+    return code_result
+
+
+def _ta_signals(stock_code: str, trade_day: str, result: Dict[str, Any]):
+    """signals_hkex_ta1 / signals_hkex_ta2 rows of a successful HK TA result"""
+    data = result.get('data_from_sergio_ta', {})
+
+    signals_hkex_ta1 = {
+        'stockname': stock_code,
+        'tradeDay': trade_day,
+        'high20': data.get('high20'),
+        'low20': data.get('low20'),
+        'high50': data.get('high50'),
+        'low50': data.get('low50'),
+        'high250': data.get('high250'),
+        'low250': data.get('low250')
+    }
+
+    signals_hkex_ta2 = {
+        'stockname': stock_code,
+        'tradeDay': trade_day,
+        'pr5': data.get('pr5'),
+        'pr20': data.get('pr20'),
+        'pr60': data.get('pr60'),
+        'pr125': data.get('pr125'),
+        'pr250': data.get('pr250'),
+        'rsi14': data.get('rsi14')
+    }
+    return signals_hkex_ta1, signals_hkex_ta2
+
+
+def _flatten(results: Any) -> List[Dict[str, Any]]:
+    """Chord header results (single-code dicts and/or batch lists) as one list"""
+    items = []
+    for result in results or []:
+        for item in (result if isinstance(result, list) else [result]):
+            items.append(item if isinstance(item, dict) else {"status": "error", "message": str(item)})
+    return items
+
+
+def _summarise_results(results: Any, stage: str) -> Dict[str, int]:
+    """Count per-code outcomes of a chord header made of single-code and/or batch tasks"""
+    summary = {"success": 0, "error": 0}
+    for item in _flatten(results):
+        summary["success" if item.get("status") == "success" else "error"] += 1
+    logger.info(f"{stage} results: {summary['success']} succeeded, {summary['error']} failed")
+    return summary
+
+
+def _resume_codes(stage: str, trade_day: str, codes: List[str], signal_files: List[str],
+                  force: bool = False) -> List[str]:
+    """
+    Codes still to compute for `stage` on `trade_day`. A fresh run clears the stage's signal files;
+    a resumed run keeps them and only schedules codes without a checkpoint.
+    `force` drops the trade day's checkpoints and failure ledger first, so every code is recomputed.
+    """
+    if force:
+        logger.info(f"Forced {stage} run for {trade_day}: clearing checkpoints")
+        reset_checkpoints(stage, trade_day)
+    pending = pending_codes(stage, trade_day, codes)
+    if len(pending) == len(codes):
+        for file_name in signal_files:
+            worker_runtime.run(file_service.clear_file_content(file_name))
+            shard_writer.clear(file_name)
+    else:
+        logger.info(f"Resuming {stage} run for {trade_day}: {len(codes) - len(pending)} codes already done, {len(pending)} to go")
+    return pending
+
+
+def _publish_ta_benchmark(trade_day: str) -> Optional[str]:
+    """Load 2800 closes for HK TA and publish them; None when there is no data"""
+    rows_2800 = worker_runtime.run(call_get_symbol_adjusted_data('2800', window=ta_benchmark_window(trade_day)))
+    if not rows_2800:
+        return None
+
+    data_2800 = []
+    for row in rows_2800:
+        trade_date = row[2]
+        close_price = row[12]
+        if close_price is not None and trade_date <= datetime.strptime(trade_day, '%Y-%m-%d').date():
+            data_2800.append({
+                "close": float(close_price),
+                "date": trade_date
+            })
+    return publish_payload("ta", trade_day, data_2800)
+
+
+def _publish_energy_benchmark(trade_day: str) -> Optional[str]:
+    """Load 2800 for HK Energy and publish it; None when there is no data for the trade day"""
+    results_2800 = worker_runtime.run(
+        call_get_symbol_adjusted_data('2800', window=energy_price_window(trade_day))
+    )
+    if not results_2800:
+        return None
+
+    prepared_2800_data = prepare_stock_data(results_2800, trade_day, '2800.HK')
+    if not prepared_2800_data:
+        return None
+
+    return publish_payload("energy", trade_day, [record.dict() for record in prepared_2800_data])
+
+
+def _fused_price_window(trade_day: str) -> PriceWindow:
+    """History covering both the HK TA and the HK Energy window of `trade_day`"""
+    ta_window = ta_price_window(trade_day)
+    energy_window = energy_price_window(trade_day)
+    return PriceWindow(end_date=trade_day, columns=tuple(sorted(set(ta_window.columns) | set(energy_window.columns))))
+
 
 # HK Energy
 @celery_app.task(bind=True, name='prepare_hk_energy')
-def prepare_hk_energy_task(self, trade_day: str):
+def prepare_hk_energy_task(self, trade_day: str, force: bool = False):
     """
     Prepare data for calculation HK Energy
     """
     try:
-        try:
-            # Prepare 2800 data
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        # Prepare 2800 data, published once and passed to tasks by key
+        stock_data_2800_ref = _publish_energy_benchmark(trade_day)
+        if stock_data_2800_ref is None:
+            clear_hk_energy_token.delay([])
+            return {'status': 'error', 'message': 'There is no data for 2800'}
+
+        # Get stocks codes
+        stocks_codes = worker_runtime.run( get_stocks_codes())
+        logger.info(f"Stocks codes received: {len(stocks_codes.get('codes', []))} codes")
+
+        # Send tasks to process HK Energy (codes checkpointed by an interrupted run are skipped)
+        codes = _resume_codes("energy", trade_day, list(stocks_codes.get("codes", [])), [settings.signal_file_name], force)
+        if settings.task_chunk_size > 1:
+            tasks = [process_hk_energy_batch_task.s(chunk, stock_data_2800_ref, trade_day) for chunk in _chunks(codes, settings.task_chunk_size)]
+        else:
+            tasks = [process_hk_energy_task.s(code, stock_data_2800_ref, trade_day) for code in codes] #! REMOVE
 
-            results_2800 = loop.run_until_complete(
-                call_get_symbol_adjusted_data('2800')
-            )
-            if not results_2800: 
-                clear_hk_energy_token.delay([])
-                return {'status': 'error', 'message': 'There is no data for 2800'}
-
-            prepared_2800_data = prepare_stock_data(results_2800, trade_day, '2800.HK')
-            if not prepared_2800_data:
-                clear_hk_energy_token.delay([])
-                return {'status': 'error', 'message': 'There is no data for 2800'}
-
-            # Get stocks codes
-            stocks_codes = loop.run_until_complete( get_stocks_codes())
-            logger.info(f"Stocks codes received: {len(stocks_codes.get('codes', []))} codes")
-
-            # Send tasks to process HK Energy
-            stock_data_2800_dict = [record.dict() for record in prepared_2800_data]
-            tasks = [process_hk_energy_task.s(code, stock_data_2800_dict, trade_day) for code in stocks_codes.get("codes", [])] #! REMOVE
-
-            chord(tasks)(clear_hk_energy_token.s())
-        finally:
-            loop.close()
+        chord(tasks)(clear_hk_energy_token.s())
     except Exception as e:
         logger.error(f"prepare_hk_energy_task error: {e}")
 
@@ -111,47 +316,50 @@ def prepare_hk_energy_task(self, trade_day: str):
         return {'status': 'error', 'message': str(e)}
 
 @celery_app.task(bind=True, name='process_hk_energy_task')
-def process_hk_energy_task(self, stock_code: str, stock_data_2800_dict: List[Dict], trade_day: str):
+def process_hk_energy_task(self, stock_code: str, stock_data_2800_ref: Union[str, List[Dict]], trade_day: str):
     """
     Celery task to process HK energy analysis
     """
+    started = time.perf_counter()
     try:        
-        #Stock data 2800 to EnergyStockRecord
-        stock_data_2800 = [EnergyStockRecord(**record_dict) for record_dict in stock_data_2800_dict]
+        #Stock data 2800 to EnergyStockRecord, parsed once per worker process
+        stock_data_2800 = load_payload(stock_data_2800_ref, _energy_records)
 
         # Get data for stock
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            stock_data_results = loop.run_until_complete(
-                call_get_symbol_adjusted_data(stock_code)
-            )
-            if not stock_data_results: 
-                # clear_hk_energy_token.delay([])
-                return {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'}
+        stock_data_results = worker_runtime.run(
+            call_get_symbol_adjusted_data(stock_code, window=energy_price_window(trade_day))
+        )
+        if not stock_data_results: 
+            # clear_hk_energy_token.delay([])
+            _track("energy", trade_day, stock_code, started, {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'})
+            return {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'}
 
-            prepared_stock_data = prepare_stock_data(stock_data_results, trade_day, stock_code)
-            if not prepared_stock_data:
-                # clear_hk_energy_token.delay([])
-                return {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'}
+        prepared_stock_data = prepare_stock_data(stock_data_results, trade_day, stock_code)
+        if not prepared_stock_data:
+            # clear_hk_energy_token.delay([])
+            _track("energy", trade_day, stock_code, started, {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'})
+            return {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'}
 
+        
+        energy_result = worker_runtime.run( 
+            HK_Energy_TA.start(stock_code.strip(), trade_day.strip(), prepared_stock_data, stock_data_2800 ))
+        if energy_result["status"] == "success" and len(energy_result["indicators"]) > 0:
             
-            energy_result = loop.run_until_complete( 
-                HK_Energy_TA.start(stock_code.strip(), trade_day.strip(), prepared_stock_data, stock_data_2800 ))
-            if energy_result["status"] == "success" and len(energy_result["indicators"]) > 0:
-                
-                file_service.add_data_to_csv(settings.signal_file_name, energy_result["indicators"], ['stock_code', 'date', 'E1', 'E2', 'E3', 'E4', 'E5', 'is_latest'])
-                
-            else:
-                logger.warning(f"Not saving to CSV: status={energy_result.get('status')}, indicators_count={len(energy_result.get('indicators', []))}")
-                
-            return energy_result
-        finally:
-                loop.close()
+            shard_writer.write(settings.signal_file_name, energy_result["indicators"], ENERGY_FIELDS)
+            shard_writer.flush()
+            
+        else:
+            logger.warning(f"Not saving to CSV: status={energy_result.get('status')}, indicators_count={len(energy_result.get('indicators', []))}")
+        if energy_result["status"] == "success":
+            mark_completed("energy", trade_day, [stock_code])
+        else:
+            _track("energy", trade_day, stock_code, started, energy_result)
+            
+        return energy_result
             
     except Exception as exc:
         logger.error(f"Error in HK Energy task for {stock_code}: {str(exc)}")
+        _track("energy", trade_day, stock_code, started, {'status': 'error', 'message': str(exc)})
         # Update task state to FAILURE
         self.update_state(
             state='FAILURE',
@@ -159,109 +367,111 @@ def process_hk_energy_task(self, stock_code: str, stock_data_2800_dict: List[Dic
         )
         raise exc
 
+@celery_app.task(bind=True, name='process_hk_energy_batch')
+def process_hk_energy_batch_task(self, stock_codes: List[str], stock_data_2800_ref: Union[str, List[Dict]], trade_day: str):
+    """
+    Celery task to process HK energy analysis for a chunk of codes.
+    Histories are loaded in bulk; the outcome of every code is returned to the chord callback.
+    """
+    stock_data_2800 = load_payload(stock_data_2800_ref, _energy_records)
+    histories = worker_runtime.run(
+        load_symbols_adjusted_data(stock_codes, energy_price_window(trade_day))
+    )
+
+    results = []
+    indicators = []
+    completed = []
+    for stock_code in stock_codes:
+        started = time.perf_counter()
+        try:
+            prepared_stock_data = prepare_stock_data(histories.get(stock_code.strip()) or [], trade_day, stock_code)
+            if not prepared_stock_data:
+                results.append(_track("energy", trade_day, stock_code, started, {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'}))
+                continue
+
+            energy_result = worker_runtime.run(
+                HK_Energy_TA.start(stock_code.strip(), trade_day.strip(), prepared_stock_data, stock_data_2800))
+            if energy_result["status"] == "success":
+                indicators.extend(energy_result["indicators"])
+                completed.append(stock_code)
+            results.append(_track("energy", trade_day, stock_code, started, energy_result))
+        except Exception as exc:
+            logger.error(f"Error in HK Energy batch for {stock_code}: {str(exc)}")
+            results.append(_track("energy", trade_day, stock_code, started, {'status': 'error', 'message': str(exc)}))
+
+    shard_writer.write(settings.signal_file_name, indicators, ENERGY_FIELDS)
+    shard_writer.flush()
+    mark_completed("energy", trade_day, completed)
+    return results
+
+def _finish_hk_energy():
+    """Clear the HK Energy token and merge this run's signals into the Energy table"""
+    # Clear hk_energy_token
+    worker_runtime.run(
+        file_service.clear_file_content(settings.hk_energy_token_file_name)
+    )
+    _merge_energy_signals()
+
+
+def _merge_energy_signals(codes: Optional[Set[str]] = None, trade_day: Optional[str] = None) -> None:
+    """
+    Save HK Energy signals (only those of `codes` / `trade_day` when given) in the Energy table
+    and update is_latest
+    """
+    shard_writer.merge(settings.signal_file_name, ENERGY_FIELDS)
+    hkex_energy = worker_runtime.run(
+        file_service.read_data_from_csv(settings.signal_file_name)
+    )
+    if codes is not None:
+        hkex_energy = [row for row in hkex_energy if row['stock_code'].strip() in codes]
+    if trade_day is not None:
+        hkex_energy = [row for row in hkex_energy if row['date'].strip() == trade_day]
+    # Older rows of these codes lose is_latest; rows of a resumed / repeated run replace their earlier copies
+    result_store.merge(settings.test_db_table_energy, hkex_energy)
+
+
 @celery_app.task(name='hk_energy_token_clear')
 def clear_hk_energy_token(results):
     logger.info("All HK Energy tasks completed, clearing hk_energy_token")
+    _summarise_results(results, "HK Energy")
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        # Clear hk_energy_token
-        try:
-            loop.run_until_complete(
-                file_service.clear_file_content(settings.hk_energy_token_file_name)
-            )
-        # Update is_latest
-            hkex_energy = loop.run_until_complete(
-                file_service.read_data_from_csv(settings.signal_file_name)
-            )
-        # Save all HK Energy signals in db
-            if hkex_energy:
-
-                existing_test_data = loop.run_until_complete(
-                    file_service.read_data_from_csv(settings.test_db_table_energy)
-                )
-                if existing_test_data:
-                    hkex_stock_codes = set(row['stock_code'] for row in hkex_energy)
-                    
-                    updated_test_data = []
-                    for row in existing_test_data:
-                        if row['stock_code'] in hkex_stock_codes:
-                            row['is_latest'] = '0'
-                        updated_test_data.append(row)
-                    
-                    if updated_test_data:
-                        loop.run_until_complete(file_service.clear_file_content(settings.test_db_table_energy))
-                        
-                        file_service.add_data_to_csv(
-                        settings.test_db_table_energy, 
-                        updated_test_data, 
-                        ['stock_code', 'date', 'E1', 'E2', 'E3', 'E4', 'E5', 'is_latest']
-                    )
-
-                file_service.add_data_to_csv(settings.test_db_table_energy, hkex_energy, ['stock_code', 'date', 'E1', 'E2', 'E3', 'E4', 'E5', 'is_latest'])
-
-            logger.info("Successfully cleared hk_energy_token")
-            return {"status": "success", "message": "Token cleared"}
-        finally:
-            loop.close()
+        _finish_hk_energy()
+        logger.info("Successfully cleared hk_energy_token")
+        return {"status": "success", "message": "Token cleared"}
     except Exception as exc:
         logger.error(f"Error clearing hk_ta_token: {str(exc)}")
         return {"status": "error", "message": str(exc)}
 
 #HK TA
 @celery_app.task(bind=True, name='process_hk_ta')
-def process_hk_ta_task(self, stock_code: str, trade_day: str, data_2800: List[Dict]):
+def process_hk_ta_task(self, stock_code: str, trade_day: str, data_2800_ref: Union[str, List[Dict]]):
     """
     Celery task to process HK TA analysis
     """
+    started = time.perf_counter()
     try:
+        data_2800 = load_payload(data_2800_ref)
         logger.info(f"Starting HK TA analysis for {stock_code} on {trade_day}")
         
-        # Run the async service in sync context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result =  loop.run_until_complete(
-                    HK_TA.start(stock_code, trade_day, data_2800)
-            )
-            logger.info(f"Completed HK TA analysis for {stock_code}")
-            if result["status"] == "error":
-                logger.error(f"Error in HK TA analysis for {stock_code}: {result['message']}")
-                return result
-            data = result.get('data_from_sergio_ta', {})
-
-            signals_hkex_ta1 = {
-                'stockname': stock_code,
-                'tradeDay': trade_day,
-                'high20': data.get('high20'),
-                'low20': data.get('low20'),
-                'high50': data.get('high50'),
-                'low50': data.get('low50'),
-                'high250': data.get('high250'),
-                'low250': data.get('low250')
-            }
-                        
-            signals_hkex_ta2 = {
-                'stockname': stock_code,
-                'tradeDay': trade_day,
-                'pr5': data.get('pr5'),
-                'pr20': data.get('pr20'),
-                'pr60': data.get('pr60'),
-                'pr125': data.get('pr125'),
-                'pr250': data.get('pr250'),
-                'rsi14': data.get('rsi14')
-            }
-            file_service.add_data_to_csv(settings.signals_hkex_ta1_file_name, [signals_hkex_ta1], ['stockname', 'tradeDay', 'high20', 'low20', 'high50', 'low50', 'high250', 'low250'])
-            
-            file_service.add_data_to_csv(settings.signals_hkex_ta2_file_name, [signals_hkex_ta2], ['stockname', 'tradeDay', 'pr5', 'pr20', 'pr60', 'pr125', 'pr250', 'rsi14'])
+        # Run the async service on the worker loop
+        result = worker_runtime.run(
+                HK_TA.start(stock_code, trade_day, data_2800)
+        )
+        logger.info(f"Completed HK TA analysis for {stock_code}")
+        if result["status"] == "error":
+            logger.error(f"Error in HK TA analysis for {stock_code}: {result['message']}")
+            _track("ta", trade_day, stock_code, started, result)
             return result
-        finally:
-            loop.close()
+        signals_hkex_ta1, signals_hkex_ta2 = _ta_signals(stock_code, trade_day, result)
+        shard_writer.write(settings.signals_hkex_ta1_file_name, [signals_hkex_ta1], TA1_FIELDS)
+        shard_writer.write(settings.signals_hkex_ta2_file_name, [signals_hkex_ta2], TA2_FIELDS)
+        shard_writer.flush()
+        mark_completed("ta", trade_day, [stock_code])
+        return result
 
     except Exception as exc:
         logger.error(f"Error in HK TA task for {stock_code}: {str(exc)}")
+        _track("ta", trade_day, stock_code, started, {'status': 'error', 'message': str(exc)})
         # Update task state to FAILURE
         self.update_state(
             state='FAILURE',
@@ -269,16 +479,143 @@ def process_hk_ta_task(self, stock_code: str, trade_day: str, data_2800: List[Di
         )
         raise exc
 
-@celery_app.task(bind=True, name='prepare_hk_ta', max_retries=MAX_ATTEMPTS-1, default_retry_delay=60)
-def prepare_hk_ta(self):
+@celery_app.task(bind=True, name='process_hk_ta_batch')
+def process_hk_ta_batch_task(self, stock_codes: List[str], trade_day: str, data_2800_ref: Union[str, List[Dict]]):
+    """
+    Celery task to process HK TA analysis for a chunk of codes.
+    Histories are loaded in bulk; the outcome of every code is returned to the chord callback.
+    """
+    data_2800 = load_payload(data_2800_ref)
+    histories = worker_runtime.run(
+        load_symbols_adjusted_data(stock_codes, ta_price_window(trade_day))
+    )
+
+    results = []
+    ta1_rows = []
+    ta2_rows = []
+    completed = []
+    for stock_code in stock_codes:
+        started = time.perf_counter()
+        try:
+            result = worker_runtime.run(
+                HK_TA.start(stock_code, trade_day, data_2800, rows=histories.get(stock_code.strip()) or [])
+            )
+            if result["status"] == "success":
+                signals_hkex_ta1, signals_hkex_ta2 = _ta_signals(stock_code, trade_day, result)
+                ta1_rows.append(signals_hkex_ta1)
+                ta2_rows.append(signals_hkex_ta2)
+                completed.append(stock_code)
+            else:
+                logger.error(f"Error in HK TA analysis for {stock_code}: {result['message']}")
+            results.append(_track("ta", trade_day, stock_code, started, result))
+        except Exception as exc:
+            logger.error(f"Error in HK TA batch for {stock_code}: {str(exc)}")
+            results.append(_track("ta", trade_day, stock_code, started, {'status': 'error', 'message': str(exc)}))
+
+    shard_writer.write(settings.signals_hkex_ta1_file_name, ta1_rows, TA1_FIELDS)
+    shard_writer.write(settings.signals_hkex_ta2_file_name, ta2_rows, TA2_FIELDS)
+    shard_writer.flush()
+    mark_completed("ta", trade_day, completed)
+    return results
+
+@celery_app.task(bind=True, name='process_hk_fused_batch')
+def process_hk_fused_batch_task(self, stock_codes: List[str], trade_day: str,
+                                data_2800_ref: Union[str, List[Dict]], stock_data_2800_ref: Union[str, List[Dict]]):
+    """
+    Celery task computing HK TA and HK Energy for a chunk of codes from one load of each history.
+    Both output sets are written; every code reports one TA and one Energy outcome.
+    A stage already checkpointed for a code (resumed run) is not computed again.
+    """
+    data_2800 = load_payload(data_2800_ref)
+    stock_data_2800 = load_payload(stock_data_2800_ref, _energy_records)
+    histories = worker_runtime.run(
+        load_symbols_adjusted_data(stock_codes, _fused_price_window(trade_day))
+    )
+    energy_window = energy_price_window(trade_day)
+    ta_done = completed_codes("ta", trade_day)
+    energy_done = completed_codes("energy", trade_day)
+
+    results = []
+    ta1_rows = []
+    ta2_rows = []
+    indicators = []
+    ta_completed = []
+    energy_completed = []
+    for stock_code in stock_codes:
+        rows = histories.get(stock_code.strip()) or []
+
+        if stock_code.strip() in ta_done:
+            results.append(_code_result(stock_code, {'status': 'success', 'message': 'Already done'}, "ta"))
+        else:
+            started = time.perf_counter()
+            try:
+                result = worker_runtime.run(HK_TA.start(stock_code, trade_day, data_2800, rows=rows))
+                if result["status"] == "success":
+                    signals_hkex_ta1, signals_hkex_ta2 = _ta_signals(stock_code, trade_day, result)
+                    ta1_rows.append(signals_hkex_ta1)
+                    ta2_rows.append(signals_hkex_ta2)
+                    ta_completed.append(stock_code)
+                results.append(_track("ta", trade_day, stock_code, started, result))
+            except Exception as exc:
+                logger.error(f"Error in HK TA (fused) for {stock_code}: {str(exc)}")
+                results.append(_track("ta", trade_day, stock_code, started, {'status': 'error', 'message': str(exc)}))
+
+        if stock_code.strip() in energy_done:
+            results.append(_code_result(stock_code, {'status': 'success', 'message': 'Already done'}, "energy"))
+            continue
+        started = time.perf_counter()
+        try:
+            prepared_stock_data = prepare_stock_data(rows, trade_day, stock_code, energy_window)
+            if not prepared_stock_data:
+                results.append(_track("energy", trade_day, stock_code, started, {'status': 'error', 'message': f'There is no data for {stock_code} at {trade_day}'}))
+                continue
+            energy_result = worker_runtime.run(
+                HK_Energy_TA.start(stock_code.strip(), trade_day.strip(), prepared_stock_data, stock_data_2800))
+            if energy_result["status"] == "success":
+                indicators.extend(energy_result["indicators"])
+                energy_completed.append(stock_code)
+            results.append(_track("energy", trade_day, stock_code, started, energy_result))
+        except Exception as exc:
+            logger.error(f"Error in HK Energy (fused) for {stock_code}: {str(exc)}")
+            results.append(_track("energy", trade_day, stock_code, started, {'status': 'error', 'message': str(exc)}))
+
+    shard_writer.write(settings.signals_hkex_ta1_file_name, ta1_rows, TA1_FIELDS)
+    shard_writer.write(settings.signals_hkex_ta2_file_name, ta2_rows, TA2_FIELDS)
+    shard_writer.write(settings.signal_file_name, indicators, ENERGY_FIELDS)
+    shard_writer.flush()
+    mark_completed("ta", trade_day, ta_completed)
+    mark_completed("energy", trade_day, energy_completed)
+    return results
+
+@celery_app.task(name='hk_fused_token_clear')
+def clear_hk_fused_tokens(results, date: str):
+    logger.info(f"All fused HK TA + Energy tasks completed for {date}, clearing tokens")
+    _summarise_results([item for item in _flatten(results) if item.get("stage") == "ta"], "HK TA")
+    _summarise_results([item for item in _flatten(results) if item.get("stage") == "energy"], "HK Energy")
+    # Each stage is finished on its own, so a failing TA merge cannot keep the Energy token held
+    errors = []
+    for stage, finish in (("HK TA", _finish_hk_ta), ("HK Energy", _finish_hk_energy)):
+        try:
+            finish()
+        except Exception as exc:
+            logger.error(f"Error finishing {stage} in the fused run: {str(exc)}")
+            errors.append(f"{stage}: {exc}")
+    if errors:
+        return {"status": "error", "message": "; ".join(errors)}
+    return {"status": "success", "message": "Tokens cleared, HK TA and HK Energy saved"}
+
+@celery_app.task(bind=True, name='prepare_hk_ta', max_retries=None, default_retry_delay=60)
+def prepare_hk_ta(self, started_at: Optional[float] = None, force: bool = False):
     """
     Celery task to check HK TA database status with retry mechanism
-    Waits 1 minute between attempts if no data found
+    The delay between checks comes from the configured poll trigger (settings.hk_ta_trigger);
+    a hk_prices_ready message starts the check immediately instead.
+    `force` recomputes every code even if the trade day's run already completed.
     """
-    loop = None
     from services.task_scheduler import TaskScheduler
 
     scheduler = TaskScheduler()
+    started_at = started_at or time.time()
     try:
         logger.info(f"Checking HK TA database status working!")
         
@@ -286,16 +623,10 @@ def prepare_hk_ta(self):
                 CALL get_todays_finished_events("set_adjusted_prices");
                 """
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         # Cancel existing retry task
-        loop.run_until_complete(scheduler.cancel_existing_retry_task())
-
-        # restart connections for db_service
-        db_service.close_all_connections()
+        worker_runtime.run(scheduler.cancel_existing_retry_task())
 
-        prices_update_date = loop.run_until_complete(db_service.execute_query(init_sql_query))
+        prices_update_date = worker_runtime.run(db_service.execute_query(init_sql_query))
         logger.info(f"Finished events: {prices_update_date}")
 
 
@@ -303,57 +634,73 @@ def prepare_hk_ta(self):
                 logger.info(f"Data found and processed, {prices_update_date[0][0]}")
                 
                 # Get codes
-                response_data = loop.run_until_complete(get_stocks_codes())
+                response_data = worker_runtime.run(get_stocks_codes())
                 if not response_data.get("date") or not response_data.get("codes"):
                     logger.warning("No data found in get_stocks_codes")
                     raise Exception("No data found in get_stocks_codes")
                 
                 
                 trade_day_date = str(response_data["date"])
+
+                # Adjusted prices are final for the day: sync the local price store
+                if settings.price_store_enabled:
+                    worker_runtime.run(refresh_price_store(list(response_data["codes"]) + ['2800']))
                 # trade_day_date = "2025-09-04"
 
                 # Get data for 2800
-                rows_2800 = loop.run_until_complete(call_get_symbol_adjusted_data('2800'))
-                if not rows_2800:
+                data_2800_ref = _publish_ta_benchmark(trade_day_date)
+                if data_2800_ref is None:
                     raise Exception(f"There is no data for 2800")
 
-                data_2800 = []
-                for row in rows_2800:
-                    trade_date = row[2]
-                    close_price = row[12]
-                    if close_price is not None and trade_date <= datetime.strptime(trade_day_date, '%Y-%m-%d').date():
-                        data_2800.append({
-                            "close": float(close_price),
-                            "date": trade_date
-                        })
-
-
-
                 # tasks = [process_hk_ta_task.s(code, response_data["date"]) for code in response_data["codes"][:10]] #! REMOVE
-                tasks = [process_hk_ta_task.s(code, trade_day_date, data_2800) for code in response_data["codes"]]
-
-                chord(tasks)(clear_hk_ta_token.s(trade_day_date)) 
+                codes = list(response_data["codes"])
+                ta_files = [settings.signals_hkex_ta1_file_name, settings.signals_hkex_ta2_file_name]
+                if settings.hk_pipeline_mode == "fused":
+                    # TA and Energy in one fan-out: every symbol is loaded once for both
+                    energy_2800_ref = _publish_energy_benchmark(trade_day_date)
+                    if energy_2800_ref is None:
+                        raise Exception(f"There is no data for 2800")
+                    pending = set(_resume_codes("ta", trade_day_date, codes, ta_files, force)) | \
+                        set(_resume_codes("energy", trade_day_date, codes, [settings.signal_file_name], force))
+                    codes = [code for code in codes if code in pending]
+                    file_service.add_data_to_csv(settings.hk_energy_token_file_name, [{"task_id": self.request.id}], ["task_id"])
+
+                    tasks = [process_hk_fused_batch_task.s(chunk, trade_day_date, data_2800_ref, energy_2800_ref)
+                             for chunk in _chunks(codes, max(1, settings.task_chunk_size))]
+                    chord(tasks)(clear_hk_fused_tokens.s(trade_day_date))
+                else:
+                    codes = _resume_codes("ta", trade_day_date, codes, ta_files, force)
+                    if settings.task_chunk_size > 1:
+                        tasks = [process_hk_ta_batch_task.s(chunk, trade_day_date, data_2800_ref) for chunk in _chunks(codes, settings.task_chunk_size)]
+                    else:
+                        tasks = [process_hk_ta_task.s(code, trade_day_date, data_2800_ref) for code in codes]
+
+                    # TA -> Energy hand-off stays inside Celery
+                    chord(tasks)(clear_hk_ta_token.s(trade_day_date) | start_hk_energy_after_ta.s(trade_day_date, force))
         else:
                 cur = getattr(self.request, "retries", 0)
                 attempt = cur + 1
-                logger.info(f"No data found, attempt {attempt} of {MAX_ATTEMPTS}")
+                elapsed = time.time() - started_at
+                delay = get_poll_trigger().next_delay(attempt, elapsed)
+                logger.info(f"No data found, attempt {attempt} after {elapsed:.0f}s")
                 
-                if cur >= MAX_ATTEMPTS - 1:
-                    logger.warning(f"HK TA check timeout after {MAX_ATTEMPTS} attempts")
+                if delay is None:
+                    logger.warning(f"HK TA check timeout after {attempt} attempts")
 
                     # ваші дії після таймауту
-                    loop.run_until_complete(scheduler.schedule_retry_task(delay_hours=settings.daily_retry))
-                    loop.run_until_complete(file_service.clear_file_content(settings.hk_ta_token_file_name))
+                    worker_runtime.run(scheduler.schedule_retry_task(delay_hours=settings.daily_retry))
+                    worker_runtime.run(file_service.clear_file_content(settings.hk_ta_token_file_name))
 
                     # Позначили як успіх/таймаут і ВАЖЛИВО: завершуємося return-ом
                     self.update_state(
                         state='SUCCESS',
                         meta={'status': 'timeout',
-                            'message': f'No data found after {MAX_ATTEMPTS} attempts',
+                            'message': f'No data found after {attempt} attempts',
                             'attempts': attempt}
                     )
                     return {'status': 'timeout', 'attempts': attempt}
-                raise self.retry(countdown=60)
+                logger.info(f"Next check in {delay:.0f}s")
+                raise self.retry(countdown=delay, kwargs={"started_at": started_at, "force": force})
 
     
     except Retry:
@@ -363,58 +710,140 @@ def prepare_hk_ta(self):
         logger.error(f"Error in check_hk_ta_task: {str(exc)}")
         # self.update_state(state='FAILURE', meta={'error': str(exc)})
         raise
-    finally: 
-        if loop:
-            loop.close()
+
+def _finish_hk_ta():
+    """Schedule the daily retry, clear the HK TA token and merge this run's signals into the TA tables"""
+    from services.task_scheduler import TaskScheduler
+
+    scheduler = TaskScheduler()
+    try:
+        # Set retry task
+        worker_runtime.run(scheduler.schedule_retry_task(delay_hours=settings.daily_retry))
+    finally:
+        # Clear hk_ta_token
+        worker_runtime.run(
+            file_service.clear_file_content(settings.hk_ta_token_file_name)
+        )
+    # Save all HK TA signals in db
+    _merge_ta_signals()
+
+
+def _merge_ta_signals(codes: Optional[Set[str]] = None, trade_day: Optional[str] = None) -> None:
+    """
+    Save HK TA signals in the TA tables, only those of `codes` / `trade_day` when given.
+    Rows of a resumed / repeated run replace their earlier copies.
+    """
+    for signals_file, table, fieldnames in ((settings.signals_hkex_ta1_file_name, settings.test_db_table_ta1, TA1_FIELDS),
+                                            (settings.signals_hkex_ta2_file_name, settings.test_db_table_ta2, TA2_FIELDS)):
+        shard_writer.merge(signals_file, fieldnames)
+        rows = worker_runtime.run(file_service.read_data_from_csv(signals_file))
+        if codes is not None:
+            rows = [row for row in rows if row['stockname'].strip() in codes]
+        if trade_day is not None:
+            rows = [row for row in rows if row['tradeDay'] == trade_day]
+        result_store.merge(table, rows)
+
 
 @celery_app.task
 def clear_hk_ta_token(results, date: str):
     logger.info("All HK TA tasks completed, clearing hk_ta_token")
-    from services.task_scheduler import TaskScheduler
+    _summarise_results(results, "HK TA")
+    try:
+        _finish_hk_ta()
+        return {"status": "success", "message": "Token cleared"}
+    except Exception as exc:
+        logger.error(f"Error clearing hk_ta_token: {str(exc)}")
+        return {"status": "error", "message": str(exc)}
 
-    scheduler = TaskScheduler()
+
+async def start_hk_energy(trade_day: str, force: bool = False) -> Dict[str, str]:
+    """
+    Take the HK Energy token and queue prepare_hk_energy for `trade_day`.
+    Shared by /api/hk-energy and the TA -> Energy hand-off; `force` ignores the day's checkpoints.
+    """
+    hk_energy_token = await file_service.read_data_from_csv(settings.hk_energy_token_file_name)
+
+    # Old signals are cleared by prepare_hk_energy unless the trade day's run is resumed
+    existing_task_id = hk_energy_token[0].get("task_id") if hk_energy_token else None
+    if existing_task_id:
+        return {"task_id": existing_task_id, "status": "ERROR", "message": "HK Energy already started"}
+
+    file_service.add_data_to_csv(settings.hk_energy_token_file_name, [{"task_id": '001'}], ["task_id"])
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            # Set retry task
-            loop.run_until_complete(scheduler.schedule_retry_task(delay_hours=settings.daily_retry))
+        task_result = prepare_hk_energy_task.delay(trade_day, force)
+        logger.info(f"Prepare task started with ID: {task_result.id}")
+    except Exception as e:
+        logger.error(f"Error creating tasks: {e}")
+        await file_service.clear_file_content(settings.hk_energy_token_file_name)
+        raise
 
-            # Clear hk_ta_token
-            loop.run_until_complete(
-                file_service.clear_file_content(settings.hk_ta_token_file_name)
-            )
-            # Save all HK TA signals in db
-            ta_1 = loop.run_until_complete(
-                file_service.read_data_from_csv(settings.signals_hkex_ta1_file_name)
-            )
-            if ta_1:
-                file_service.add_data_to_csv(settings.test_db_table_ta1, ta_1, ['stockname', 'tradeDay', 'high20', 'low20', 'high50', 'low50', 'high250', 'low250'])
-                
-            ta_2 = loop.run_until_complete(
-                file_service.read_data_from_csv(settings.signals_hkex_ta2_file_name)
-            )
-            if ta_2:
-                file_service.add_data_to_csv(settings.test_db_table_ta2, ta_2, ['stockname', 'tradeDay', 'pr5', 'pr20', 'pr60', 'pr125', 'pr250', 'rsi14'])
+    return {"task_id": '001', "status": "QUEUED", "message": "HK Energy started"}
 
-            # Start HK Energy
-            endpoint_url = f"{BASE_URL}/api/hk-energy"
 
-            response = requests.post(endpoint_url, timeout=30, json={"trade_day": date})
-            logger.info(f"Response: {response.json()}")
+@celery_app.task(name='start_hk_energy_after_ta')
+def start_hk_energy_after_ta(ta_result: Dict[str, Any], trade_day: str, force: bool = False):
+    """Chained after clear_hk_ta_token: starts HK Energy once the TA results are saved"""
+    if not isinstance(ta_result, dict) or ta_result.get("status") != "success":
+        logger.error(f"HK TA did not finish cleanly, HK Energy not started: {ta_result}")
+        return {"status": "error", "message": "HK Energy not started"}
+    try:
+        result = worker_runtime.run(start_hk_energy(trade_day, force))
+        logger.info(f"HK Energy start: {result}")
+        return result
+    except Exception as exc:
+        logger.error(f"Error starting HK Energy: {str(exc)}")
+        return {"status": "error", "message": str(exc)}
 
-            if response.status_code == 200:
-                message = "Token cleared, HK Energy started"
-            else:
-                message = "Token cleared, HK Energy - error"
+# Re-run of failed codes
+RERUN_TOKENS = {"ta": settings.hk_ta_token_file_name, "energy": settings.hk_energy_token_file_name}
 
-            return {"status": "success", "message": message}
-        finally:
-            loop.close()
+
+@celery_app.task(bind=True, name='rerun_failed_codes')
+def rerun_failed_codes_task(self, stage: str, trade_day: str, stock_codes: List[str]):
+    """
+    Re-queue `stock_codes` of a finished `stage` ("ta" / "energy") run for the same trade day.
+    Their outputs are appended to the signal files and merged into the result tables by the chord callback.
+    """
+    try:
+        if stage == "ta":
+            benchmark_ref = _publish_ta_benchmark(trade_day)
+            batch_task = process_hk_ta_batch_task
+        else:
+            benchmark_ref = _publish_energy_benchmark(trade_day)
+            batch_task = process_hk_energy_batch_task
+        if benchmark_ref is None:
+            raise Exception(f"There is no data for 2800")
+
+        chunks = _chunks(stock_codes, max(1, settings.task_chunk_size))
+        if stage == "ta":
+            tasks = [batch_task.s(chunk, trade_day, benchmark_ref) for chunk in chunks]
+        else:
+            tasks = [batch_task.s(chunk, benchmark_ref, trade_day) for chunk in chunks]
+        chord(tasks)(merge_rerun_results.s(stage, trade_day, stock_codes))
+        return {"status": "success", "message": f"{len(stock_codes)} codes re-queued"}
     except Exception as exc:
-        logger.error(f"Error clearing hk_ta_token: {str(exc)}")
+        logger.error(f"Error re-running failed {stage} codes for {trade_day}: {str(exc)}")
+        worker_runtime.run(file_service.clear_file_content(RERUN_TOKENS[stage]))
+        return {"status": "error", "message": str(exc)}
+
+
+@celery_app.task(name='merge_rerun_results')
+def merge_rerun_results(results, stage: str, trade_day: str, stock_codes: List[str]):
+    """Chord callback of rerun_failed_codes: merge the re-run codes' outputs and release the stage token"""
+    summary = _summarise_results(results, f"Re-run {stage}")
+    try:
+        succeeded = {item["stock_code"].strip() for item in _flatten(results) if item.get("status") == "success"}
+        if stage == "ta":
+            _merge_ta_signals(succeeded, trade_day)
+        else:
+            _merge_energy_signals(succeeded, trade_day)
+        return {"status": "success", "message": "Re-run merged", **summary}
+    except Exception as exc:
+        logger.error(f"Error merging re-run results: {str(exc)}")
         return {"status": "error", "message": str(exc)}
+    finally:
+        worker_runtime.run(file_service.clear_file_content(RERUN_TOKENS[stage]))
+
 
 # scheduler task 
 @celery_app.task(name='retry_hk_ta')
@@ -422,9 +851,7 @@ def retry_hk_ta_task():
     try:
         from controllers.hk_ta.hk_ta_init_task import hk_ta_initialise
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
+        result = worker_runtime.run(
             asyncio.wait_for(hk_ta_initialise(), timeout=500.0)  
         )
         
@@ -433,9 +860,22 @@ def retry_hk_ta_task():
     except Exception as exc:
         logger.error(f"Error in retry_hk_ta_task: {str(exc)}")
         return {"status": "error", "message": str(exc)}
-    finally:
-        if loop:
-            loop.close()
+
+@celery_app.task(name='hk_prices_ready')
+def hk_prices_ready_task():
+    """
+    Sent by the price loader once set_adjusted_prices has finished (celery send_task or POST /hk-ta/prices-ready):
+    starts HK TA, or wakes a prepare_hk_ta that is waiting for its next poll
+    """
+    try:
+        from controllers.hk_ta.hk_ta_init_task import hk_ta_prices_ready
+
+        result = worker_runtime.run(hk_ta_prices_ready())
+        logger.info(f"Prices ready trigger handled: {result}")
+        return result
+    except Exception as exc:
+        logger.error(f"Error in hk_prices_ready_task: {str(exc)}")
+        return {"status": "error", "message": str(exc)}
 
 def cancel_task(task_id: str):
     """Cancel a task by task ID"""  
@@ -0,0 +1,204 @@
+import csv
+import io
+import os
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.logger import setup_logger
+from config.settings import settings
+
+result_logger = setup_logger("result_store")
+logger = result_logger
+
+ENERGY_FIELDS = ['stock_code', 'date', 'E1', 'E2', 'E3', 'E4', 'E5', 'is_latest']
+TA1_FIELDS = ['stockname', 'tradeDay', 'high20', 'low20', 'high50', 'low50', 'high250', 'low250']
+TA2_FIELDS = ['stockname', 'tradeDay', 'pr5', 'pr20', 'pr60', 'pr125', 'pr250', 'rsi14']
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    fields: Tuple[str, ...]
+    key: Tuple[str, str]  # (code, date)
+    latest: Optional[str] = None  # flag column reset to '0' on a code's older rows
+
+
+TABLES: Dict[str, TableSpec] = {
+    settings.test_db_table_ta1: TableSpec(tuple(TA1_FIELDS), ("stockname", "tradeDay")),
+    settings.test_db_table_ta2: TableSpec(tuple(TA2_FIELDS), ("stockname", "tradeDay")),
+    settings.test_db_table_energy: TableSpec(tuple(ENERGY_FIELDS), ("stock_code", "date"), "is_latest"),
+}
+
+
+class ResultStore:
+    """
+    The TA / Energy result tables in SQLite, keyed by (code, date).
+    A merge touches only the day's rows: upserts by key, and is_latest is reset through a
+    partial index that holds only the rows still flagged, so the cost does not grow with history.
+    A table is imported once from its legacy CSV (test_db_table_*.csv) by migrate() or by its
+    first merge; reads never import, so a download cannot move the CSV away from other readers.
+    """
+
+    def __init__(self, path: str = settings.result_store_path, csv_dir: str = settings.base_path):
+        self.path = path
+        self.csv_dir = csv_dir
+        self._ready = set()
+        self._migrated = set()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _ensure(self, connection: sqlite3.Connection, table: str) -> TableSpec:
+        spec = TABLES[table]
+        if table in self._ready:
+            return spec
+
+        columns = ", ".join(f'"{field}" TEXT' if field in spec.key else f'"{field}"' for field in spec.fields)
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" ({columns}, PRIMARY KEY ("{spec.key[0]}", "{spec.key[1]}"))'
+        )
+        # Day partitions for /api/files?trade_day=
+        connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_date" ON "{table}" ("{spec.key[1]}")')
+        if spec.latest:
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_flagged" ON "{table}" ("{spec.key[0]}") '
+                f'WHERE "{spec.latest}" IS NOT \'0\''
+            )
+        self._ready.add(table)
+        return spec
+
+    def migrate(self) -> None:
+        """Import the legacy CSV of every table that still has one (run once at startup)"""
+        for table in TABLES:
+            with self._connect() as connection:
+                self._migrate(connection, table)
+
+    def _migrate(self, connection: sqlite3.Connection, table: str) -> TableSpec:
+        spec = self._ensure(connection, table)
+        if table not in self._migrated:
+            self._import_csv(connection, table, spec)
+            self._migrated.add(table)
+        return spec
+
+    def _import_csv(self, connection: sqlite3.Connection, table: str, spec: TableSpec) -> None:
+        csv_path = os.path.join(self.csv_dir, f"{table}.csv")
+        if not os.path.exists(csv_path):
+            return
+        if connection.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() is not None:
+            logger.warning(f"{csv_path} ignored: the result store already holds {table}")
+            return
+        with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            rows = list(csv.DictReader(csvfile))
+        self._upsert(connection, table, spec, rows)
+        connection.commit()
+        # The store is the source of truth from now on
+        try:
+            os.replace(csv_path, csv_path + ".imported")
+        except FileNotFoundError:
+            # Another process imported it at the same time; the upsert above was idempotent
+            return
+        logger.info(f"Imported {len(rows)} rows of {csv_path} into the result store")
+
+    def _upsert(self, connection: sqlite3.Connection, table: str, spec: TableSpec, rows: Sequence[Dict]) -> None:
+        fields = ", ".join(f'"{field}"' for field in spec.fields)
+        placeholders = ", ".join("?" for _ in spec.fields)
+        connection.executemany(
+            f'INSERT OR REPLACE INTO "{table}" ({fields}) VALUES ({placeholders})',
+            ([str(row.get(field)).strip() if field in spec.key else row.get(field) for field in spec.fields]
+             for row in rows)
+        )
+
+    def merge(self, table: str, rows: List[Dict]) -> int:
+        """
+        Add a run's rows to `table`, replacing rows with the same (code, date).
+        For tables with a latest flag, the older rows of the codes in `rows` are reset to '0' first;
+        a row older than the newest one already stored for its code (a re-run of a past day) is
+        stored with the flag at '0' instead, so every code keeps a single latest row.
+        """
+        if not rows:
+            return 0
+        with self._connect() as connection:
+            spec = self._migrate(connection, table)
+            if spec.latest:
+                rows, codes = self._demote_past_rows(connection, table, spec, rows)
+                connection.executemany(
+                    f'UPDATE "{table}" SET "{spec.latest}" = \'0\' '
+                    f'WHERE "{spec.key[0]}" = ? AND "{spec.latest}" IS NOT \'0\'',
+                    ((code,) for code in codes)
+                )
+            self._upsert(connection, table, spec, rows)
+        logger.info(f"Merged {len(rows)} rows into {table}")
+        return len(rows)
+
+    def _demote_past_rows(self, connection: sqlite3.Connection, table: str, spec: TableSpec,
+                          rows: List[Dict]) -> Tuple[List[Dict], List[str]]:
+        """`rows` with past-day rows unflagged, and the codes whose stored rows give up is_latest"""
+        code_field, date_field = spec.key
+        newest: Dict[str, Optional[str]] = {}
+        for code in {str(row.get(code_field)).strip() for row in rows}:
+            # Served by the (code, date) primary key
+            newest[code] = connection.execute(
+                f'SELECT MAX("{date_field}") FROM "{table}" WHERE "{code_field}" = ?', (code,)
+            ).fetchone()[0]
+
+        result = []
+        current = set()
+        for row in rows:
+            code = str(row.get(code_field)).strip()
+            stored = newest[code]
+            if stored is not None and str(row.get(date_field)).strip() < stored:
+                row = {**row, spec.latest: '0'}
+            else:
+                current.add(code)
+            result.append(row)
+        return result, sorted(current)
+
+    def to_csv(self, table: str) -> str:
+        """`table` in the layout of the legacy CSV file"""
+        return b"".join(self.iter_csv(table)).decode("utf-8")
+
+    def iter_csv(self, table: str, trade_day: Optional[str] = None, chunk_rows: int = 5000) -> Iterator[bytes]:
+        """
+        `table` (only the rows dated `trade_day` when given) as CSV, `chunk_rows` rows per chunk.
+        The connection may be used from several threads, as Starlette iterates sync generators in a threadpool.
+        """
+        with self._connect() as connection:
+            spec = self._ensure(connection, table)
+
+        fields = ", ".join(f'"{field}"' for field in spec.fields)
+        query = f'SELECT {fields} FROM "{table}"'
+        params: Tuple = ()
+        if trade_day is not None:
+            query += f' WHERE "{spec.key[1]}" = ?'
+            params = (trade_day,)
+        query += ' ORDER BY rowid'
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(spec.fields)
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        try:
+            cursor = connection.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                writer.writerows(rows)
+                if buffer.tell():
+                    yield buffer.getvalue().encode("utf-8")
+                    buffer.seek(0)
+                    buffer.truncate()
+                if not rows:
+                    break
+        finally:
+            connection.close()
+
+
+result_store = ResultStore()
@@ -0,0 +1,77 @@
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from config.logger import setup_logger
+from config.settings import settings
+
+trigger_logger = setup_logger("triggers")
+logger = trigger_logger
+
+
+class PollTrigger(ABC):
+    """
+    Decides when prepare_hk_ta checks for finished price adjustment again.
+    next_delay() gets the number of checks made so far and the seconds since the first one,
+    and returns the countdown in seconds, or None once the run should give up.
+    """
+
+    @abstractmethod
+    def next_delay(self, attempt: int, elapsed: float) -> Optional[float]:
+        ...
+
+
+class FixedIntervalTrigger(PollTrigger):
+    """Check every `interval` seconds, at most `max_attempts` times (the original behaviour)"""
+
+    def __init__(self, interval: float = 60.0, max_attempts: int = 720):
+        self.interval = interval
+        self.max_attempts = max_attempts
+
+    def next_delay(self, attempt: int, elapsed: float) -> Optional[float]:
+        if attempt >= self.max_attempts:
+            return None
+        return self.interval
+
+
+class BackoffTrigger(PollTrigger):
+    """
+    Exponential back-off with jitter, bounded by `max_delay` and a deadline.
+    Checks are frequent right after the run starts and thin out while prices are late,
+    so a 12 hour window costs a few hundred retries at most instead of 720.
+    Only worth enabling once the price loader calls /api/hk-ta/prices-ready, which
+    starts the run without waiting for the next check.
+    """
+
+    def __init__(self, initial_delay: float = settings.hk_ta_poll_initial_delay,
+                 max_delay: float = settings.hk_ta_poll_max_delay,
+                 deadline: float = settings.hk_ta_poll_deadline_hours * 3600,
+                 factor: float = 1.5, jitter: float = 0.2):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.factor = factor
+        self.jitter = jitter
+
+    def next_delay(self, attempt: int, elapsed: float) -> Optional[float]:
+        remaining = self.deadline - elapsed
+        if remaining <= 0:
+            return None
+        delay = min(self.max_delay, self.initial_delay * self.factor ** min(max(attempt - 1, 0), 64))
+        # Jitter keeps several schedulers from polling MySQL in lock-step
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(1.0, min(delay, remaining))
+
+
+TRIGGERS: Dict[str, Type[PollTrigger]] = {
+    "fixed": FixedIntervalTrigger,
+    "backoff": BackoffTrigger,
+}
+
+
+def get_poll_trigger(name: str = settings.hk_ta_trigger) -> PollTrigger:
+    trigger = TRIGGERS.get(name)
+    if trigger is None:
+        logger.warning(f"Unknown HK TA trigger '{name}', using fixed")
+        trigger = FixedIntervalTrigger
+    return trigger()